@@ -0,0 +1,47 @@
+# agents/fast_path.py
+"""
+Direct tool dispatch for structured lookups.
+
+"Find product info for product title: X" and "... for identifier: X" (what
+the batch lookup sends) always end in one `return_direct` tool call, so the
+router calls that tool with the extracted argument instead of paying an
+agent LLM round trip to pick it.
+"""
+import os
+import re
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from agents.intent_classifier import IDENTIFIER_LOOKUP_PATTERN, SHOPPING, TITLE_LOOKUP_PATTERN, WEB
+
+ROUTER_FAST_PATH = os.getenv("ROUTER_FAST_PATH", "1").lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class FastPath:
+    pattern: re.Pattern
+    agent_key: str  # agents_dict key whose tool this replaces
+    tool_name: str
+    call: Callable[[str], Awaitable]
+
+
+def default_fast_paths() -> List[FastPath]:
+    from tools.shopping_tool import afetch_shopping_results
+    from tools.web_shopping_tool import afetch_product_combined
+
+    return [
+        FastPath(TITLE_LOOKUP_PATTERN, SHOPPING, "search_shopping", afetch_shopping_results),
+        FastPath(IDENTIFIER_LOOKUP_PATTERN, WEB, "search_product_combined", afetch_product_combined),
+    ]
+
+
+def match_fast_path(query: str, fast_paths: List[FastPath]) -> Optional[Tuple[FastPath, str]]:
+    """The fast path for `query` and its argument, or None for free-form questions."""
+    query = query.strip()
+    for fast_path in fast_paths:
+        match = fast_path.pattern.match(query)
+        if match:
+            argument = query[match.end():].strip()
+            if argument:
+                return fast_path, argument
+    return None
@@ -1,9 +1,11 @@
 import pandas as pd
 from typing import Dict, Any
+from utils.batch_runner import BATCH_CONCURRENCY, arun_deduplicated
 
 class FileUploadAgent:
-    def __init__(self, master_router_agent):
+    def __init__(self, master_router_agent, concurrency: int = BATCH_CONCURRENCY):
         self.master_router_agent = master_router_agent
+        self.concurrency = concurrency
 
     async def process_uploaded_file(self, uploaded_file) -> Dict[str, Any]:
         # Load the file into a DataFrame
@@ -37,11 +39,13 @@ class FileUploadAgent:
         if not queries:
             return {"responses": [{"agent": "FileUploadAgent", "content": "⚠️ Uploaded file must contain at least one valid 'Product Title', 'ASIN', or 'EAN'."}]}
 
-        # Run master router agent for each query to respect intent detection
-        results = []
-        for q in queries:
-            response = await self.master_router_agent.run(q)
-            results.append(response)
+        # Run master router agent for each unique query to respect intent detection;
+        # repeated ASINs/EANs/titles share one lookup
+        results = await arun_deduplicated(queries, self.master_router_agent.run, concurrency=self.concurrency)
+        results = [
+            {"responses": [{"agent": "FileUploadAgent", "content": f"⚠️ Lookup failed: {r}"}]} if isinstance(r, Exception) else r
+            for r in results
+        ]
 
         # Aggregate all responses in one dictionary
         return {"responses": results}
@@ -0,0 +1,147 @@
+# agents/intent_classifier.py
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from rank_bm25 import BM25Okapi
+
+SHOPPING = "shopping_agent"
+WEB = "web_shopping_agent"
+
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.75"))
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "4096"))
+# A BM25 score below this means the query shares too little with any example
+BM25_MIN_SCORE = float(os.getenv("INTENT_BM25_MIN_SCORE", "1.0"))
+
+# Upper-case 10-character codes with at least one digit (B0... ASINs, ISBN-10s); plain words don't qualify
+ASIN_PATTERN = re.compile(r"\b(?=[A-Z0-9]{10}\b)[A-Z]*\d[A-Z0-9]*\b")
+EAN_PATTERN = re.compile(r"\b\d{13}\b")
+TITLE_LOOKUP_PATTERN = re.compile(r"^find product info for product title:", re.IGNORECASE)
+IDENTIFIER_LOOKUP_PATTERN = re.compile(r"^find product info for identifier:", re.IGNORECASE)
+SEO_PATTERN = re.compile(
+    r"\b(seo|meta ?title|meta ?description|keywords?|tags|categor(y|ize|isation|ization)|"
+    r"(technical |product )?description)\b",
+    re.IGNORECASE,
+)
+WEB_PATTERN = re.compile(
+    r"\b(search (the )?(web|internet|online)|look ?up online|external reviews?|rare|unlisted|"
+    r"hard[- ]to[- ]find|discontinued)\b",
+    re.IGNORECASE,
+)
+
+# Labelled example queries for the BM25 scorer
+EXAMPLES: Dict[str, List[str]] = {
+    SHOPPING: [
+        "what is the price of the samsung galaxy s24",
+        "compare iphone 15 and pixel 8 specifications",
+        "is the sony wh-1000xm5 available in stock",
+        "show me laptops under 1000 dollars",
+        "best 27 inch 4k monitor price",
+        "specs of benq pd2705q",
+        "write a meta title for this blender",
+        "generate seo description for nike air max 90",
+        "give me keywords and a category for a gaming chair",
+        "technical description for dyson v15 vacuum",
+        "how much does the lg c3 oled tv cost",
+        "model number of the bosch serie 6 washing machine",
+    ],
+    WEB: [
+        "find this discontinued product online",
+        "search the web for reviews of this rare camera lens",
+        "look up an unlisted sku on the internet",
+        "find external reviews for this obscure gadget",
+        "this product is hard to find can you search online",
+        "find product details for this barcode",
+        "identify product from asin",
+        "what product has this ean code",
+        "search the internet for this part number",
+        "find where to buy this out of production item",
+    ],
+}
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def _tokenize(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+class LocalIntentClassifier:
+    """
+    Tiered, in-process intent classifier.
+
+    1. Rules: ASIN/EAN codes, the structured batch lookups and SEO/web keywords.
+    2. BM25 over labelled example queries, confidence = top label's share of
+       the two best label scores.
+    Returns `(agents, confidence)`; callers fall back to the LLM when the
+    confidence is below `INTENT_CONFIDENCE_THRESHOLD`.
+    """
+
+    def __init__(self, examples: Dict[str, List[str]] = EXAMPLES):
+        self.labels = []
+        corpus = []
+        for label, queries in examples.items():
+            for query in queries:
+                self.labels.append(label)
+                corpus.append(_tokenize(query))
+        self.bm25 = BM25Okapi(corpus)
+
+    def _rules(self, query: str) -> Optional[Tuple[List[str], float]]:
+        if IDENTIFIER_LOOKUP_PATTERN.search(query):
+            return [WEB], 1.0
+        if TITLE_LOOKUP_PATTERN.search(query):
+            return [SHOPPING], 1.0
+        if ASIN_PATTERN.search(query) or EAN_PATTERN.search(query):
+            return [WEB], 1.0
+
+        seo = bool(SEO_PATTERN.search(query))
+        web = bool(WEB_PATTERN.search(query))
+        if seo and web:
+            return [SHOPPING, WEB], 0.9
+        if seo:
+            return [SHOPPING], 0.9
+        if web:
+            return [WEB], 0.9
+        return None
+
+    def _score(self, query: str) -> Tuple[List[str], float]:
+        scores = self.bm25.get_scores(_tokenize(query))
+        best: Dict[str, float] = {}
+        for label, score in zip(self.labels, scores):
+            best[label] = max(best.get(label, 0.0), float(score))
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        top_label, top = ranked[0]
+        second = ranked[1][1] if len(ranked) > 1 else 0.0
+        if top < BM25_MIN_SCORE:
+            return [top_label], 0.0
+        return [top_label], top / (top + max(second, 0.0))
+
+    def classify(self, query: str) -> Tuple[List[str], float]:
+        return self._rules(query) or self._score(query)
+
+
+class IntentCache:
+    """Thread-safe LRU of normalised query -> agents list."""
+
+    def __init__(self, maxsize: int = INTENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return list(self._data[key])
+
+    def set(self, key: str, agents: List[str]):
+        with self._lock:
+            self._data[key] = list(agents)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
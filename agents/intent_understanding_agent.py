@@ -1,16 +1,23 @@
 # agents/intent_understanding_agent.py
-import re
 import json
-from langchain.chat_models import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
 from langchain.chains import LLMChain
-from asyncio import to_thread
+from agents.registry import get_chat_llm
+from agents.intent_classifier import (
+    INTENT_CONFIDENCE_THRESHOLD,
+    IntentCache,
+    LocalIntentClassifier,
+    normalize_query,
+)
 
 
 class IntentUnderstandingAgent:
-    def __init__(self):
-        self.llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0)
+    def __init__(self, confidence_threshold: float = INTENT_CONFIDENCE_THRESHOLD):
+        self.llm = get_chat_llm("gpt-4o-mini", temperature=0)
         self.chain = self._create_chain()
+        self.classifier = LocalIntentClassifier()
+        self.cache = IntentCache()
+        self.confidence_threshold = confidence_threshold
 
     def _create_chain(self):
         system_template = (
@@ -39,20 +46,31 @@ Important:
         prompt = ChatPromptTemplate.from_messages([system_msg, human_msg])
         return LLMChain(llm=self.llm, prompt=prompt)
 
-    async def run(self, user_query: str):
-        asin_pattern = r'\b[A-Z0-9]{10}\b'
-        ean_pattern = r'\b\d{13}\b'
+    def classify_local(self, user_query: str):
+        """Cache and local classifier only; returns None when the LLM is needed."""
+        key = normalize_query(user_query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return {"agents": cached, "confidence": 1.0, "source": "cache"}
 
-        normalized_query = user_query.upper()
+        agents, confidence = self.classifier.classify(user_query)
+        if confidence >= self.confidence_threshold:
+            self.cache.set(key, agents)
+            return {"agents": agents, "confidence": confidence, "source": "local"}
+        return None
 
-        if re.search(asin_pattern, normalized_query) or re.search(ean_pattern, user_query):
-            return {"agents": ["web_shopping_agent"]}
+    async def run(self, user_query: str):
+        local = self.classify_local(user_query)
+        if local is not None:
+            return local
 
         try:
-            response = await to_thread(self.chain.run, query=user_query)
+            response = await self.chain.arun(query=user_query)
             result = json.loads(response.strip())
             if "agents" not in result or not isinstance(result["agents"], list):
                 raise ValueError("Invalid JSON keys or types")
+            self.cache.set(normalize_query(user_query), result["agents"])
+            result["source"] = "llm"
             return result
         except Exception as e:
             print(f"Intent Understanding LLM error or invalid response: {e}. Defaulting to shopping_agent.")
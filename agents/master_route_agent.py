@@ -1,31 +1,156 @@
 import asyncio
+import hashlib
 import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from agents.fast_path import ROUTER_FAST_PATH, default_fast_paths, match_fast_path
+
+# Per-agent deadline (seconds) when several agents run for one query
+AGENT_TIMEOUT = float(os.getenv("AGENT_TIMEOUT", "60"))
+ROUTER_FAN_OUT = os.getenv("ROUTER_FAN_OUT", "1").lower() in ("1", "true", "yes")
+# Call records kept per wrapper; full payloads only go to disk when a directory is set
+AGENT_LOG_SIZE = int(os.getenv("AGENT_LOG_SIZE", "200"))
+AGENT_PAYLOAD_DIR = os.getenv("AGENT_PAYLOAD_DIR") or None
+
+
+@dataclass
+class CallRecord:
+    query_hash: str
+    agent: str
+    started_at: float
+    latency_ms: float
+    result_size: int
+    error: Optional[str] = None
+    payload_ref: Optional[str] = None  # "<file>:<byte offset>" when payloads are spilled
+
+
+def _result_size(response) -> int:
+    if isinstance(response, (list, dict)):
+        return len(response)
+    return len(str(response)) if response is not None else 0
+
 
 class AgentWrapper:
-    def __init__(self, name, agent_instance):
+    def __init__(self, name, agent_instance, log_size: int = AGENT_LOG_SIZE, payload_dir: Optional[str] = AGENT_PAYLOAD_DIR):
         self.name = name
         self.agent = agent_instance
-        self.memory = []
+        self.memory = deque(maxlen=log_size)  # CallRecord ring buffer, constant size per session
+        self.payload_dir = payload_dir
+        self._payload_lock = threading.Lock()
+
+    def _spill_payload(self, query: str, context, response) -> Optional[str]:
+        if not self.payload_dir:
+            return None
+        os.makedirs(self.payload_dir, exist_ok=True)
+        path = os.path.join(self.payload_dir, f"{self.name}.jsonl")
+        line = json.dumps({"query": query, "context": context, "response": response}, ensure_ascii=False, default=str)
+        with self._payload_lock, open(path, "a", encoding="utf-8") as f:
+            offset = f.tell()
+            f.write(line + "\n")
+        return f"{path}:{offset}"
+
+    async def _record(self, query: str, context, started: float, response, error: Optional[str]):
+        latency_ms = (time.time() - started) * 1000
+        # The payload file append is blocking I/O, so it runs off the shared event loop
+        payload_ref = await asyncio.to_thread(self._spill_payload, query, context, response) if self.payload_dir else None
+        self.memory.append(CallRecord(
+            query_hash=hashlib.sha1(query.encode("utf-8")).hexdigest()[:12],
+            agent=self.name,
+            started_at=started,
+            latency_ms=latency_ms,
+            result_size=_result_size(response),
+            error=error,
+            payload_ref=payload_ref,
+        ))
 
     async def run(self, query: str, context=None):
-        self.memory.append({"query": query, "context": context})
-        if asyncio.iscoroutinefunction(self.agent.run):
-            response = await self.agent.run(query)
-        else:
-            # Run sync functions in a thread to not block async loop
-            response = await asyncio.to_thread(self.agent.run, query)
-        self.memory.append({"response": response})
-        return response
+        started = time.time()
+        response, error = None, None
+        try:
+            if asyncio.iscoroutinefunction(self.agent.run):
+                response = await self.agent.run(query)
+            elif hasattr(self.agent, "arun"):
+                # LangChain executors: native async path, tools run their coroutines
+                response = await self.agent.arun(query)
+            else:
+                # Run sync functions in the shared, bounded pool to not block the loop
+                response = await asyncio.to_thread(self.agent.run, query)
+            return response
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            await self._record(query, context, started, response, error)
+
+    async def run_direct(self, fast_path, argument: str, query: str):
+        """Call the agent's tool without the agent loop; the turn still lands in its conversation memory."""
+        started = time.time()
+        response, error = None, None
+        try:
+            response = await fast_path.call(argument)
+            memory = getattr(self.agent, "memory", None)
+            if memory is not None:
+                memory.save_context({"input": query}, {"output": response})
+            return response
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            await self._record(query, {"fast_path": fast_path.tool_name}, started, response, error)
+
+    def call_log(self):
+        return [asdict(record) for record in self.memory]
+
+    def history_tokens(self):
+        """Tokens of conversation history sent with this agent's latest turn, if it tracks them."""
+        return getattr(getattr(self.agent, "memory", None), "last_prompt_tokens", None)
 
 
 # master_route_agent.py (or wherever your MasterRouterAgent is defined)
 
 class MasterRouterAgent:
-    def __init__(self, intent_agent_wrapper, agents_dict):
+    def __init__(self, intent_agent_wrapper, agents_dict, fan_out: bool = ROUTER_FAN_OUT, agent_timeouts=None, default_timeout: float = AGENT_TIMEOUT, fast_paths=None):
         self.intent_agent = intent_agent_wrapper  # Should be an AgentWrapper instance
         self.agents_dict = agents_dict  # dict[str, AgentWrapper]
+        self.fan_out = fan_out
+        self.agent_timeouts = agent_timeouts or {}  # dict[str, float], keyed like agents_dict
+        self.default_timeout = default_timeout
+        # list[FastPath]; pass [] to always go through the agents
+        self.fast_paths = fast_paths if fast_paths is not None else (default_fast_paths() if ROUTER_FAST_PATH else [])
+
+    def history_token_report(self):
+        return {
+            wrapper.name: tokens
+            for wrapper in self.agents_dict.values()
+            if (tokens := wrapper.history_tokens()) is not None
+        }
+
+    async def _run_with_deadline(self, agent_key: str, user_input: str):
+        agent_wrapper = self.agents_dict[agent_key]
+        timeout = self.agent_timeouts.get(agent_key, self.default_timeout)
+        try:
+            response = await asyncio.wait_for(agent_wrapper.run(user_input), timeout=timeout)
+            return {"agent": agent_wrapper.name, "content": response}
+        except asyncio.TimeoutError:
+            return {"agent": agent_wrapper.name, "content": f"⚠️ {agent_wrapper.name} timed out after {timeout:.0f}s.", "error": "timeout"}
+        except Exception as e:
+            print(f"[MasterRouterAgent] {agent_wrapper.name} failed: {e}")
+            return {"agent": agent_wrapper.name, "content": f"⚠️ {agent_wrapper.name} failed: {e}", "error": str(e)}
 
     async def run(self, user_input: str):
+        # Structured lookups skip both the intent step and the agent LLM
+        fast = match_fast_path(user_input, self.fast_paths)
+        if fast is not None and fast[0].agent_key in self.agents_dict:
+            fast_path, argument = fast
+            agent_wrapper = self.agents_dict[fast_path.agent_key]
+            response = await agent_wrapper.run_direct(fast_path, argument, user_input)
+            return {"responses": [{"agent": agent_wrapper.name, "content": response}]}
+
         intent_result_raw = await self.intent_agent.run(user_input)
 
         # Ensure intent_result is a dict (try to parse if string)
@@ -43,19 +168,19 @@ class MasterRouterAgent:
         if not agents_list:
             return {"responses": [{"agent": "MasterRouterAgent", "content": "No valid agent found for the query."}]}
 
-        selected_agent_key = agents_list[0]
-        agent_wrapper = self.agents_dict.get(selected_agent_key)
-        if agent_wrapper is None:
-            return {"responses": [{"agent": "MasterRouterAgent", "content": f"Agent '{selected_agent_key}' not found."}]}
+        if not self.fan_out:
+            agents_list = agents_list[:1]
 
-        response = await agent_wrapper.run(user_input)
+        # Registration order of agents_dict, so responses come back in the same order every time
+        selected = [key for key in self.agents_dict if key in agents_list]
+        if not selected:
+            return {"responses": [{"agent": "MasterRouterAgent", "content": f"Agent '{agents_list[0]}' not found."}]}
 
-        return {
-            "responses": [
-                {
-                    "agent": agent_wrapper.name,
-                    "content": response
-                }
-            ]
-        }
+        if len(selected) == 1:
+            agent_wrapper = self.agents_dict[selected[0]]
+            response = await agent_wrapper.run(user_input)
+            return {"responses": [{"agent": agent_wrapper.name, "content": response}]}
 
+        # Fan out: total latency is the slowest agent (capped by its deadline), failures stay partial
+        responses = await asyncio.gather(*(self._run_with_deadline(key, user_input) for key in selected))
+        return {"responses": list(responses)}
@@ -0,0 +1,97 @@
+# agents/registry.py
+"""
+Process-wide pool of reusable LLM clients, chains and agents.
+
+Everything here is stateless (or, like the intent cache, safe to share), so
+one instance serves every Streamlit session. Per-session conversation memory
+is created by the agent factories and stays in `st.session_state`.
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, List
+
+from langchain_community.chat_models import ChatOpenAI
+from langchain_core.messages import BaseMessage
+
+from utils.rate_limiter import get_limiter
+from utils.token_budget import count_tokens
+
+# Output tokens reserved per agent LLM call, settled on the usage OpenAI reports
+CHAT_EXPECTED_OUTPUT = int(os.getenv("CHAT_EXPECTED_OUTPUT", "256"))
+
+_lock = threading.RLock()
+_instances: Dict[Hashable, Any] = {}
+
+
+def get_shared(key: Hashable, factory: Callable[[], Any]) -> Any:
+    """Return the process-wide instance for `key`, building it once."""
+    instance = _instances.get(key)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(key)
+            if instance is None:
+                instance = factory()
+                _instances[key] = instance
+    return instance
+
+
+class LimitedChatOpenAI(ChatOpenAI):
+    """
+    ChatOpenAI whose requests go through the shared OpenAI limiter: request
+    and token buckets, the AIMD in-flight limit and its 429 retries.
+    """
+
+    def _reserve_tokens(self, messages: List[BaseMessage]) -> int:
+        prompt = "\n".join(str(message.content) for message in messages)
+        return count_tokens(prompt, self.model_name) + CHAT_EXPECTED_OUTPUT
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return get_limiter("openai").call(
+            super()._generate, messages, stop, run_manager, tokens=self._reserve_tokens(messages), **kwargs
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        return await get_limiter("openai").acall(
+            super()._agenerate, messages, stop, run_manager, tokens=self._reserve_tokens(messages), **kwargs
+        )
+
+
+def get_chat_llm(model: str = "gpt-4o-mini", temperature: float = 0.0) -> ChatOpenAI:
+    # 429s are retried by the limiter, which also pauses for Retry-After and halves the in-flight limit
+    return get_shared(
+        ("chat_llm", model, temperature),
+        lambda: LimitedChatOpenAI(model=model, temperature=temperature, max_retries=0),
+    )
+
+
+def get_intent_agent():
+    from agents.intent_understanding_agent import IntentUnderstandingAgent
+    return get_shared("intent_agent", IntentUnderstandingAgent)
+
+
+def get_seo_entity_extractor():
+    from agents.seo_entity_extractor import SEOEntityExtractor
+    return get_shared("seo_entity_extractor", SEOEntityExtractor)
+
+
+def get_seo_agent():
+    from agents.seo_agent import SEOAgent
+    return get_shared("seo_agent", SEOAgent)
+
+
+def create_master_agent(memory: bool = True):
+    """
+    A router over the shopping and web agents. LLM clients, chains and the
+    intent classifier are shared; the executors carry their own conversation
+    memory, so build one per session. Batch lookups run rows concurrently and
+    pass memory=False: each row is an independent one-shot query.
+    """
+    from agents.master_route_agent import AgentWrapper, MasterRouterAgent
+    from agents.shopping_agent import create_agent as create_shopping_agent
+    from agents.web_shopping_agent import create_agent as create_web_agent
+
+    agents_dict = {
+        "shopping_agent": AgentWrapper("ShoppingAgent", create_shopping_agent(use_memory=memory)),
+        "web_shopping_agent": AgentWrapper("WebShoppingAgent", create_web_agent(use_memory=memory)),
+    }
+    return MasterRouterAgent(get_intent_agent(), agents_dict)
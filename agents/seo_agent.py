@@ -1,26 +1,16 @@
 import json
-import asyncio
-from langchain.chat_models import ChatOpenAI
 from langchain.chains import LLMChain
 from langchain.prompts import (
     ChatPromptTemplate,
     SystemMessagePromptTemplate,
     HumanMessagePromptTemplate,
 )
-from agents.seo_entity_extractor import SEOEntityExtractor  # Adjust import as needed
-from concurrent.futures import ThreadPoolExecutor
-
-# Utility to run blocking code asynchronously in a thread
-executor = ThreadPoolExecutor()
-
-async def to_thread(func, *args, **kwargs):
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, lambda: func(*args, **kwargs))
+from agents.registry import get_chat_llm, get_seo_entity_extractor
 
 
 class SEOAgent:
     def __init__(self):
-        llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0.7)
+        llm = get_chat_llm("gpt-4o-mini", temperature=0.7)
         system_template = (
             "You are an expert SEO content generator. "
             "You will be given a product name and product description.\n\n"
@@ -50,13 +40,12 @@ class SEOAgent:
             product_name = input_data.get("product_name", "")
             product_description = input_data.get("product_description", "")
         else:
-            extractor = SEOEntityExtractor()
-            extracted = await extractor.run(input_data)
+            extracted = await get_seo_entity_extractor().run(input_data)
             product_name = extracted.get("product_name", "")
             product_description = extracted.get("product_description", "")
 
-        # Run chain in thread to avoid blocking event loop
-        raw = await to_thread(self.chain.run, product_name=product_name, product_description=product_description)
+        # Native async call: no thread per request
+        raw = await self.chain.arun(product_name=product_name, product_description=product_description)
 
         try:
             return json.loads(raw)
@@ -1,13 +1,12 @@
 import re
 import json
-from asyncio import to_thread
-from langchain.chat_models import ChatOpenAI
 from langchain.prompts import (
     ChatPromptTemplate,
     SystemMessagePromptTemplate,
     HumanMessagePromptTemplate,
 )
 from langchain.chains import LLMChain
+from agents.registry import get_chat_llm
 
 
 
@@ -15,7 +14,7 @@ from langchain.chains import LLMChain
 
 class SEOEntityExtractor:
     def __init__(self):
-        self.llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0)
+        self.llm = get_chat_llm("gpt-4o-mini", temperature=0)
         system_template = (
             "You are an assistant that extracts product_name and product_description from user input.\n"
             "Return STRICT JSON ONLY with keys 'product_name' and 'product_description'.\n"
@@ -29,7 +28,7 @@ class SEOEntityExtractor:
         self.chain = LLMChain(llm=self.llm, prompt=prompt)
 
     async def run(self, text: str) -> dict:
-        raw = await to_thread(self.chain.run, text=text)
+        raw = await self.chain.arun(text=text)
         try:
             return json.loads(raw)
         except Exception as e:
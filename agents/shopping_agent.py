@@ -1,10 +1,10 @@
 # agents/shopping_agent.py
 
-from langchain_community.chat_models import ChatOpenAI
-from langchain.agents import initialize_agent, AgentType
+from langchain.agents import AgentExecutor, OpenAIFunctionsAgent
 from tools.shopping_tool import search_shopping
 from conversation_history.memory import get_memory
-from langchain.prompts import SystemMessagePromptTemplate, ChatPromptTemplate
+from agents.registry import get_chat_llm, get_shared
+from langchain.prompts import SystemMessagePromptTemplate
 
 
 def get_shopping_prompt():
@@ -49,24 +49,25 @@ You are Veronica, the ShoppingAgent, an AI assistant specialized in e-commerce p
     )
 
 
-def create_agent():
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.3)
-
-    # Inject system prompt using ChatPromptTemplate
+def _build_functions_agent():
+    # Inject system prompt via the functions agent's system message
     system_prompt = SystemMessagePromptTemplate.from_template(get_shopping_prompt())
-    prompt = ChatPromptTemplate.from_messages([system_prompt])
+    return OpenAIFunctionsAgent.from_llm_and_tools(
+        llm=get_chat_llm("gpt-4o-mini", temperature=0.3),
+        tools=[search_shopping],
+        system_message=system_prompt.format(),
+    )
 
-    memory = get_memory()
-    tools = [search_shopping]
 
-    agent = initialize_agent(
-        tools=tools,
-        llm=llm,
-        agent=AgentType.OPENAI_FUNCTIONS,
-        memory=memory,
+def create_agent(memory=None, use_memory: bool = True):
+    # The LLM client and functions agent are shared process-wide; only the memory is per session.
+    # use_memory=False builds a stateless executor that concurrent one-shot lookups can share.
+    agent = AgentExecutor.from_agent_and_tools(
+        agent=get_shared("shopping_functions_agent", _build_functions_agent),
+        tools=[search_shopping],
+        memory=(memory if memory is not None else get_memory()) if use_memory else None,
         verbose=True,
         handle_parsing_errors=True,
-        agent_kwargs={"system_message": system_prompt.format()}  # inject via agent_kwargs
     )
 
     return agent
@@ -1,18 +1,23 @@
-from langchain_community.chat_models import ChatOpenAI
-from langchain.agents import initialize_agent, AgentType
+from langchain.agents import AgentExecutor, OpenAIFunctionsAgent
 from tools.web_shopping_tool import search_product_combined
 from conversation_history.memory import get_memory
+from agents.registry import get_chat_llm, get_shared
 
-def create_agent():
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.3)
-    memory = get_memory()
-    tools = [search_product_combined]
 
-    agent = initialize_agent(
-        tools=tools,
-        llm=llm,
-        agent=AgentType.OPENAI_FUNCTIONS,
-        memory=memory,
+def _build_functions_agent():
+    return OpenAIFunctionsAgent.from_llm_and_tools(
+        llm=get_chat_llm("gpt-4o-mini", temperature=0.3),
+        tools=[search_product_combined],
+    )
+
+
+def create_agent(memory=None, use_memory: bool = True):
+    # The LLM client and functions agent are shared process-wide; only the memory is per session.
+    # use_memory=False builds a stateless executor that concurrent one-shot lookups can share.
+    agent = AgentExecutor.from_agent_and_tools(
+        agent=get_shared("web_functions_agent", _build_functions_agent),
+        tools=[search_product_combined],
+        memory=(memory if memory is not None else get_memory()) if use_memory else None,
         verbose=True,
         handle_parsing_errors=True,
     )
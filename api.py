@@ -0,0 +1,254 @@
+"""
+Headless enrichment API.
+
+    uvicorn api:app --host 0.0.0.0 --port 8000
+
+POST /enrich/fetch-filter   rows with Product Title, Model Number[, Country Code]
+POST /enrich/lookup         rows with Product Title, ASIN or EAN (router agents)
+
+The body is a JSON array of objects or a CSV (raw text/csv or a multipart
+"file" upload). Rows stream back as NDJSON in completion order, each tagged
+with its input `index`, followed by one `summary` line. Every request gets
+its own concurrency cap and estimated-cost budget on top of the process-wide
+provider rate limits; rows that would exceed the budget come back "skipped".
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from utils.async_runtime import get_executor, submit
+from utils.lazy_loader import lazy_import
+
+load_dotenv()
+
+API_MAX_ROWS = int(os.getenv("API_MAX_ROWS", "5000"))
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "16"))
+API_DEFAULT_CONCURRENCY = int(os.getenv("API_DEFAULT_CONCURRENCY", "4"))
+API_DEFAULT_MAX_COST = float(os.getenv("API_DEFAULT_MAX_COST", "1.0"))
+# Estimated prices (USD) used for the per-request budget
+SERPER_COST_PER_CALL = float(os.getenv("SERPER_COST_PER_CALL", "0.001"))
+LLM_COST_PER_1K_TOKENS = float(os.getenv("LLM_COST_PER_1K_TOKENS", "0.0008"))
+LOOKUP_COST_PER_ROW = float(os.getenv("LOOKUP_COST_PER_ROW", "0.01"))
+
+# Loaded at startup on a worker thread, so no request pays for (or blocks the loop on) the imports
+STARTUP_MODULES = ["utils.product_search", "utils.link_filter", "utils.product_utils", "utils.batch_runner", "agents.registry"]
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    loop = asyncio.get_running_loop()
+    for name in STARTUP_MODULES:
+        await loop.run_in_executor(get_executor(), lazy_import, name)
+    yield
+
+
+app = FastAPI(title="Veronica enrichment API", lifespan=lifespan)
+
+
+class BudgetExceeded(Exception):
+    """A row's next step does not fit the request budget; `fields` holds what it already produced."""
+
+    def __init__(self, fields: Dict[str, Any] = None):
+        super().__init__("cost limit reached")
+        self.fields = fields or {}
+
+
+class CostBudget:
+    """
+    Estimated spend of one request. Each paid step reserves its worst-case
+    cost before it starts and settles to the measured cost when it finishes,
+    so concurrent rows can never overshoot `max_cost` together. Thread-safe:
+    fetch/filter rows run on the blocking pool.
+    """
+
+    def __init__(self, max_cost: float):
+        self.max_cost = max_cost
+        self.spent = 0.0
+        self.reserved = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, estimate: float, fields: Dict[str, Any] = None):
+        with self._lock:
+            if self.spent + self.reserved + estimate > self.max_cost:
+                raise BudgetExceeded(fields)
+            self.reserved += estimate
+
+    def settle(self, estimate: float, actual: float):
+        with self._lock:
+            self.reserved -= estimate
+            self.spent += actual
+
+
+# --- row handlers: (row, budget) -> output fields ---
+
+def _token_cost(tokens: int) -> float:
+    return tokens / 1000 * LLM_COST_PER_1K_TOKENS
+
+
+def fetch_filter_row(row: Dict[str, Any], budget: CostBudget) -> Dict[str, Any]:
+    product_search = lazy_import("utils.product_search")
+    row = {
+        "Product Title": str(row.get("Product Title") or "").strip(),
+        "Model Number": str(row.get("Model Number") or "").strip(),
+        "Country Code": str(row.get("Country Code") or "").strip() or "us",
+    }
+    if not row["Product Title"] or not row["Model Number"]:
+        raise ValueError("row needs 'Product Title' and 'Model Number'")
+
+    budget.reserve(SERPER_COST_PER_CALL)
+    try:
+        full_rows = product_search.fetch_bulk_row(row)
+    finally:
+        budget.settle(SERPER_COST_PER_CALL, SERPER_COST_PER_CALL)  # a cached answer is free, but we can't tell
+    if product_search.has_error(full_rows):
+        raise RuntimeError(full_rows[0]["Error"])
+
+    # Worst case for these exact candidates: every chunk's prompt plus a full-length answer
+    worst = _token_cost(product_search.filter_token_bound(row, full_rows))
+    budget.reserve(worst, {"results": full_rows})
+    actual = worst
+    try:
+        filtered_rows, outcome = product_search.filter_bulk_row_with_outcome(row, full_rows)
+        actual = 0.0 if outcome is None or outcome.cached else _token_cost(outcome.prompt_tokens + outcome.completion_tokens)
+    finally:
+        budget.settle(worst, actual)
+    return {"results": full_rows, "filtered": filtered_rows}
+
+
+# --- request plumbing ---
+async def read_rows(request: Request) -> List[Dict[str, Any]]:
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(400, "multipart body needs a 'file' field")
+        text = (await upload.read()).decode("utf-8-sig")
+    else:
+        text = (await request.body()).decode("utf-8-sig")
+
+    if content_type.startswith("application/json"):
+        try:
+            rows = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise HTTPException(400, f"Invalid JSON: {e}")
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise HTTPException(400, "JSON body must be an array of objects")
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+
+    if len(rows) > API_MAX_ROWS:
+        raise HTTPException(413, f"At most {API_MAX_ROWS} rows per request")
+    return rows
+
+
+def _line(payload: Dict[str, Any]) -> bytes:
+    return (json.dumps(payload, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+async def stream_rows(
+    rows: List[Dict[str, Any]],
+    handle: Callable[[Dict[str, Any], CostBudget], Awaitable[Dict[str, Any]]],
+    concurrency: int,
+    max_cost: float,
+) -> AsyncIterator[bytes]:
+    """NDJSON lines for `rows` as they finish, at most `concurrency` in flight and within `max_cost`."""
+    budget = CostBudget(max_cost)
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+
+    async def run_row(index: int, row: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                return {"index": index, "status": "ok", **await handle(row, budget)}
+            except BudgetExceeded as e:
+                return {"index": index, "status": "skipped", "error": str(e), **e.fields}
+            except Exception as e:
+                return {"index": index, "status": "error", "error": f"{type(e).__name__}: {e}"}
+
+    tasks = [asyncio.ensure_future(run_row(index, row)) for index, row in enumerate(rows)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            result = await finished
+            counts[result["status"]] += 1
+            yield _line(result)
+        yield _line({"summary": {"rows": len(rows), **counts, "estimated_cost_usd": round(budget.spent, 6)}})
+    finally:
+        # Client went away: stop paying for rows nobody will read
+        for task in tasks:
+            task.cancel()
+
+
+def _ndjson(stream: AsyncIterator[bytes]) -> StreamingResponse:
+    return StreamingResponse(stream, media_type="application/x-ndjson")
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.post("/enrich/fetch-filter")
+async def enrich_fetch_filter(
+    request: Request,
+    concurrency: int = Query(API_DEFAULT_CONCURRENCY, ge=1, le=API_MAX_CONCURRENCY),
+    max_cost: float = Query(API_DEFAULT_MAX_COST, gt=0),
+):
+    """Serper shopping search + model-number link filter per row."""
+    rows = await read_rows(request)
+    loop = asyncio.get_running_loop()
+
+    async def handle(row, budget):
+        return await loop.run_in_executor(get_executor(), fetch_filter_row, row, budget)
+
+    return _ndjson(stream_rows(rows, handle, concurrency, max_cost))
+
+
+@app.post("/enrich/lookup")
+async def enrich_lookup(
+    request: Request,
+    concurrency: int = Query(API_DEFAULT_CONCURRENCY, ge=1, le=API_MAX_CONCURRENCY),
+    max_cost: float = Query(API_DEFAULT_MAX_COST, gt=0),
+):
+    """MasterRouterAgent lookup per row; duplicate queries in one request share a single lookup."""
+    rows = await read_rows(request)
+    product_utils = lazy_import("utils.product_utils")
+    batch_runner = lazy_import("utils.batch_runner")
+    # Memory-less, so concurrent rows can't read each other's turns. Building the
+    # agents is blocking work, so it stays off this event loop.
+    master_agent = await asyncio.get_running_loop().run_in_executor(
+        get_executor(), lazy_import("agents.registry").create_master_agent, False
+    )
+    # dedupe key -> [future of the shared lookup, rows still waiting on it]
+    lookups: Dict[str, list] = {}
+
+    async def handle(row, budget):
+        query = product_utils.lookup_query(row)
+        if query is None:
+            raise ValueError("row needs 'Product Title', 'ASIN' or 'EAN'")
+        key = batch_runner.dedupe_key(query)
+        if key not in lookups or lookups[key][0].cancelled():
+            budget.reserve(LOOKUP_COST_PER_ROW)
+            budget.settle(LOOKUP_COST_PER_ROW, LOOKUP_COST_PER_ROW)
+            # The agents run on the shared event loop, like in the Streamlit apps
+            lookups[key] = [asyncio.wrap_future(submit(master_agent.run(query))), 0]
+        lookup = lookups[key]
+        lookup[1] += 1
+        try:
+            response = await asyncio.shield(lookup[0])
+        finally:
+            lookup[1] -= 1
+            if lookup[1] == 0 and not lookup[0].done():
+                lookup[0].cancel()  # no row is waiting any more: stop the lookup on the shared loop
+        return {"query": query, "products": product_utils.extract_all_products(response)}
+
+    return _ndjson(stream_rows(rows, handle, concurrency, max_cost))
@@ -1,37 +1,39 @@
 import streamlit as st
-import asyncio
-import nest_asyncio
 
-from agents.shopping_agent import create_agent as create_shopping_agent
-from agents.web_shopping_agent import create_agent as create_web_agent
-from agents.intent_understanding_agent import IntentUnderstandingAgent
-from agents.master_route_agent import MasterRouterAgent, AgentWrapper
-
-from utils.product_utils import extract_all_products, save_products_to_files
-from utils.streamlit_utils import show_download_buttons
-import pandas as pd
-
-# Patch asyncio for Streamlit
-nest_asyncio.apply()
+from utils.async_runtime import run_async
+from utils.job_runner import submit_job, job_results
+from utils.lazy_loader import lazy_import, import_report, warm_up_in_background
+from utils.product_utils import extract_all_products, lookup_query, save_products_to_files
+from utils.streamlit_utils import show_download_buttons, show_jobs_panel
 
 st.set_page_config(page_title="🛒 Veronica")
 st.title("🧠 Veronica")
 
-if "master_agent" not in st.session_state:
-    shopping_agent = create_shopping_agent()
-    web_agent = create_web_agent()
+# The agent stack (langchain, openai, tools) and pandas load on a background thread,
+# once per process, so the page paints without waiting for them.
+AGENT_MODULES = [
+    "agents.registry",
+    "agents.master_route_agent",
+    "agents.intent_understanding_agent",
+    "agents.shopping_agent",
+    "agents.web_shopping_agent",
+]
+warm_up_in_background(AGENT_MODULES + ["pandas"])
 
-    intent_agent = IntentUnderstandingAgent()
 
-    agents_dict = {
-        "shopping_agent": AgentWrapper("ShoppingAgent", shopping_agent),
-        "web_shopping_agent": AgentWrapper("WebShoppingAgent", web_agent),
-    }
+def get_master_agent():
+    if "master_agent" not in st.session_state:
+        # LLM clients, chains and the intent classifier come from the process-wide registry;
+        # the executors only carry this session's conversation memory.
+        st.session_state.master_agent = lazy_import("agents.registry").create_master_agent()
+    return st.session_state.master_agent
 
-    st.session_state.master_agent = MasterRouterAgent(intent_agent, agents_dict)
 
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
+for key in ("batch_job_ids", "seo_job_ids"):
+    if key not in st.session_state:
+        st.session_state[key] = []
 
 # Display chat history
 for msg in st.session_state.chat_history:
@@ -72,8 +74,7 @@ if user_input:
     st.chat_message("user").markdown(user_input)
 
     with st.spinner("🤖 Routing your query to the right agent..."):
-        loop = asyncio.get_event_loop()
-        response = loop.run_until_complete(st.session_state.master_agent.run(user_input))
+        response = run_async(get_master_agent().run(user_input))
 
     st.session_state.chat_history.append({"role": "assistant", "content": response})
 
@@ -103,6 +104,10 @@ if user_input:
         else:
             st.markdown(response)
 
+        history_tokens = get_master_agent().history_token_report()
+        if history_tokens:
+            st.caption("🧾 History tokens this turn: " + ", ".join(f"{name}: {tokens}" for name, tokens in history_tokens.items()))
+
     # Save and show download buttons
     products = extract_all_products(response)
     if products:
@@ -119,6 +124,7 @@ if show_upload:
     uploaded_file = st.file_uploader("Upload product file (CSV or Excel)", type=["csv", "xlsx"])
 
     if uploaded_file is not None:
+        pd = lazy_import("pandas")
         if uploaded_file.name.endswith(".csv"):
             df = pd.read_csv(uploaded_file)
         else:
@@ -135,58 +141,48 @@ if show_upload:
             st.error("File must contain at least one of: 'Product Title', 'ASIN', or 'EAN'")
         else:
             if st.button("🔍 Search products via agents"):
+                queries = [lookup_query(row) for _, row in df.iterrows()]
+
+                # Runs in a background worker: repeated ASINs/EANs/titles are looked up once,
+                # and finished lookups are checkpointed so resubmitting the file resumes
+                job_id = submit_job("batch_lookup", queries)
+                if job_id not in st.session_state.batch_job_ids:
+                    st.session_state.batch_job_ids.insert(0, job_id)
+                st.success(f"Queued {len(queries)} rows. You can keep chatting while the job runs.")
+
+
+def render_batch_result(entry):
+    responses = job_results(entry["job_id"])
+    all_products = []
+    for idx in range(entry["total"]):
+        if idx not in responses:
+            continue
+        if isinstance(responses[idx], dict) and "error" in responses[idx]:
+            st.warning(f"⚠️ Lookup failed for row {idx + 1}: {responses[idx]['error']}")
+            continue
+        products = extract_all_products(responses[idx])
+        if products:
+            all_products.extend(products)
+            with st.expander(f"✅ Row {idx + 1}: {len(products)} products"):
+                for p in products:
+                    st.markdown(f"**🛒 Product Title:** {p.get('Product Title', '')}")
+                    st.markdown(f"- **Category:** {p.get('Category', '')}")
+                    st.markdown(f"- **Price:** {p.get('Price', '')}")
+                    st.markdown(f"- **Rating:** {p.get('Rating', '')}")
+                    st.markdown(f"- **Description:** {p.get('Description', '')}")
+                    st.markdown(f"- **Source:** {p.get('Source', '')}")
+                    if url := p.get("url") or p.get("Link"):
+                        st.markdown(f"[🔗 View Product]({url})")
+                    st.markdown("---")
+        else:
+            st.warning(f"⚠️ No products found for row {idx + 1}")
+
+    if all_products:
+        show_download_buttons(save_products_to_files(all_products), key=entry["job_id"])
+
+
+show_jobs_panel(st.session_state.batch_job_ids, render_batch_result)
 
-                async def process_rows():
-                    all_products = []
-                    progress = st.progress(0, text="🔄 Processing rows...")
-                    total_rows = len(df)
-                    success_count = 0
-
-                    for idx, row in df.iterrows():
-                        query = None
-
-                        if has_title and pd.notna(row.get("Product Title")):
-                            query = f"Find product info for product title: {row['Product Title']}"
-                        elif has_asin and pd.notna(row.get("ASIN")):
-                            query = f"Find product info for identifier: {row['ASIN']}"
-                        elif has_ean and pd.notna(row.get("EAN")):
-                            query = f"Find product info for identifier: {row['EAN']}"
-                        else:
-                            continue
-
-                        response = await st.session_state.master_agent.run(query)
-                        products = extract_all_products(response)
-
-                        if products:
-                            success_count += 1
-                            all_products.extend(products)
-
-                            st.markdown(f"### ✅ Row {idx + 1}")
-                            for p in products:
-                                st.markdown(f"**🛒 Product Title:** {p.get('Product Title', '')}")
-                                st.markdown(f"- **Category:** {p.get('Category', '')}")
-                                st.markdown(f"- **Price:** {p.get('Price', '')}")
-                                st.markdown(f"- **Rating:** {p.get('Rating', '')}")
-                                st.markdown(f"- **Description:** {p.get('Description', '')}")
-                                st.markdown(f"- **Source:** {p.get('Source', '')}")
-                                if url := p.get("url") or p.get("Link"):
-                                    st.markdown(f"[🔗 View Product]({url})")
-                                st.markdown("---")
-                        else:
-                            st.warning(f"⚠️ No products found for row {idx + 1}")
-
-                        progress.progress((idx + 1) / total_rows, text=f"🔄 Row {idx + 1}/{total_rows}")
-
-                    st.session_state.batch_products = all_products
-                    st.session_state.batch_processing_done = True
-                    st.session_state.success_count = success_count
-                    st.session_state.total_rows = total_rows
-                    st.rerun()
-
-                asyncio.run(process_rows())
-                
-                
-                
 st.markdown("---")
 st.header("📈 Bulk SEO Metadata Generation")
 
@@ -196,6 +192,7 @@ if show_seo_upload:
     seo_file = st.file_uploader("Upload CSV with product names for SEO", type=["csv"])
 
     if seo_file:
+        pd = lazy_import("pandas")
         df_seo = pd.read_csv(seo_file)
 
         if "Product Title" not in df_seo.columns:
@@ -205,59 +202,30 @@ if show_seo_upload:
             st.dataframe(df_seo.head())
 
             if st.button("⚙️ Generate SEO Metadata"):
-                async def process_seo_rows():
-                    seo_results = []
-                    progress = st.progress(0, text="🚀 Generating SEO metadata...")
-                    total = len(df_seo)
-
-                    for i, row in df_seo.iterrows():
-                        product_name = row["Product Title"]
-
-                        query = (
-                            f"Generate SEO content for the following product:\n"
-                            f"{product_name}\n"
-                            f"Return JSON with keys: meta_title, description, keywords, category."
-                        )
-
-                        response = await st.session_state.master_agent.run(query)
-
-                        # This assumes the SEO agent responds with a JSON string
-                        seo_entry = {
-                            "Product Title": product_name,
-                            "Meta Title": "",
-                            "Description": "",
-                            "Keywords": "",
-                            "Category": "",
-                        }
-
-                        if isinstance(response, dict) and "responses" in response:
-                            for item in response["responses"]:
-                                if isinstance(item["content"], str):
-                                    import json
-                                    try:
-                                        content = json.loads(item["content"])
-                                        seo_entry.update({
-                                            "Meta Title": content.get("meta_title", ""),
-                                            "Description": content.get("description", ""),
-                                            "Keywords": content.get("keywords", ""),
-                                            "Category": content.get("category", ""),
-                                        })
-                                    except json.JSONDecodeError:
-                                        pass
-
-                        seo_results.append(seo_entry)
-                        progress.progress((i + 1) / total, text=f"Processed {i+1}/{total}")
-
-                    result_df = pd.DataFrame(seo_results)
-                    st.session_state.seo_result_df = result_df
-                    st.session_state.seo_generation_done = True
-                    st.rerun()
-
-                asyncio.run(process_seo_rows())
-                
-if st.session_state.get("seo_generation_done", False):
+                # Runs in a background worker; each generated row is checkpointed
+                titles = [str(title) for title in df_seo["Product Title"]]
+                job_id = submit_job("seo_generation", titles)
+                if job_id not in st.session_state.seo_job_ids:
+                    st.session_state.seo_job_ids.insert(0, job_id)
+                st.success(f"Queued {len(titles)} products for SEO generation.")
+
+
+def render_seo_result(entry):
+    pd = lazy_import("pandas")
+    seo_results = job_results(entry["job_id"])
+    result_df = pd.DataFrame([seo_results[position] for position in sorted(seo_results)])
     st.markdown("### ✅ SEO Metadata Generated:")
-    st.dataframe(st.session_state.seo_result_df)
+    st.dataframe(result_df)
+
+    csv = result_df.to_csv(index=False).encode("utf-8")
+    st.download_button("📥 Download SEO Metadata CSV", data=csv, file_name="seo_metadata_output.csv", mime="text/csv", key=f"seo_{entry['job_id']}")
+
+
+show_jobs_panel(st.session_state.seo_job_ids, render_seo_result)
 
-    csv = st.session_state.seo_result_df.to_csv(index=False).encode("utf-8")
-    st.download_button("📥 Download SEO Metadata CSV", data=csv, file_name="seo_metadata_output.csv", mime="text/csv")
+with st.sidebar.expander("⏱️ Startup report"):
+    report = import_report()
+    if not report:
+        st.write("Nothing loaded yet.")
+    for module_name, ms in report:
+        st.write(f"`{module_name}`: {ms:.0f} ms")
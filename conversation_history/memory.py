@@ -1,4 +1,96 @@
+import json
+import os
+from typing import Any, Dict, List
+
 from langchain.memory import ConversationBufferMemory
+from langchain_core.messages import AIMessage, get_buffer_string
+
+from utils.token_budget import count_tokens
+
+MEMORY_MAX_TOKENS = int(os.getenv("MEMORY_MAX_TOKENS", "2000"))
+MEMORY_KEEP_TURNS = int(os.getenv("MEMORY_KEEP_TURNS", "3"))
+# Older assistant/tool messages longer than this are replaced by a summary
+MEMORY_SUMMARY_CHARS = int(os.getenv("MEMORY_SUMMARY_CHARS", "400"))
+
+_COMPACT_PREFIX = "[Earlier result]"
+
+
+def _to_text(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def summarize_tool_output(text: str, max_chars: int = MEMORY_SUMMARY_CHARS) -> str:
+    """Compact stand-in for a long tool output, e.g. a list of product dicts."""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        data = None
+
+    if isinstance(data, list) and data and all(isinstance(item, dict) for item in data):
+        titles = [str(item.get("Product Title") or item.get("title") or "") for item in data]
+        titles = [t for t in titles if t][:3]
+        sample = "; ".join(titles)
+        summary = f"{_COMPACT_PREFIX} {len(data)} products returned" + (f", e.g. {sample}" if sample else "")
+        return summary[:max_chars]
+
+    return f"{_COMPACT_PREFIX} {text[:max_chars].rstrip()}…"
+
+
+class TokenBoundedMemory(ConversationBufferMemory):
+    """
+    Conversation memory with a token budget.
+
+    The last `keep_last_turns` exchanges are kept verbatim. Older long
+    assistant messages (tool outputs such as product lists) are replaced by a
+    one-line summary, and the oldest messages are dropped once the history
+    exceeds `max_token_limit`. `last_prompt_tokens` holds the size of the
+    history handed to the agent on the latest turn.
+    """
+
+    max_token_limit: int = MEMORY_MAX_TOKENS
+    keep_last_turns: int = MEMORY_KEEP_TURNS
+    summary_chars: int = MEMORY_SUMMARY_CHARS
+    token_model: str = "gpt-4o-mini"
+    last_prompt_tokens: int = 0
+    prompt_token_log: List[int] = []
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, Any]) -> None:
+        # return_direct tools hand back lists of dicts; store them as text
+        super().save_context(inputs, {k: _to_text(v) for k, v in outputs.items()})
+        self._compact()
+
+    def _compact(self):
+        messages = self.chat_memory.messages
+        cutoff = len(messages) - 2 * self.keep_last_turns
+        for i in range(max(0, cutoff)):
+            message = messages[i]
+            if (
+                isinstance(message, AIMessage)
+                and isinstance(message.content, str)
+                and len(message.content) > self.summary_chars
+                and not message.content.startswith(_COMPACT_PREFIX)
+            ):
+                messages[i] = AIMessage(content=summarize_tool_output(message.content, self.summary_chars))
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        messages = self.chat_memory.messages
+        costs = [count_tokens(get_buffer_string([m]), self.token_model) for m in messages]
+        while sum(costs) > self.max_token_limit and len(messages) > 2 * self.keep_last_turns:
+            del messages[0]
+            del costs[0]
+
+        self.last_prompt_tokens = sum(costs)
+        self.prompt_token_log.append(self.last_prompt_tokens)
+        del self.prompt_token_log[:-100]
+
+        if self.return_messages:
+            return {self.memory_key: list(messages)}
+        return {
+            self.memory_key: get_buffer_string(messages, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+        }
+
 
 def get_memory():
-    return ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+    return TokenBoundedMemory(memory_key="chat_history", return_messages=True)
@@ -1,106 +1,49 @@
 import streamlit as st
-import requests
-import json
-import pandas as pd
 import io
 import os
 from dotenv import load_dotenv
-from groq import Groq
-import tiktoken
+from utils.lazy_loader import lazy_import, is_loaded, import_report, warm_up_in_background
+from utils.token_budget import token_usage_report
+from utils.bulk_pipeline import SEARCH_CONCURRENCY, FILTER_CONCURRENCY, FILTER_BATCH_SIZE
+from utils.product_search import search_serper_shopping, format_results_for_csv
+from utils.job_runner import submit_job, job_results
+from utils.streamlit_utils import show_jobs_panel
+
+# pandas, httpx and the Groq/Serper clients load on first use (or on the warm-up thread)
+HEAVY_MODULES = ["pandas", "utils.serper_client", "utils.link_filter", "utils.metadata_generator"]
 
 # Load API keys
 load_dotenv()
 SERPER_API_KEY = os.getenv("SERPER_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-groq_client = Groq(api_key=GROQ_API_KEY)
-
-# --- Serper Shopping API ---
-def search_serper_shopping(query: str, country: str = "us"):
-    url = "https://google.serper.dev/shopping"
-    payload = json.dumps({
-        "q": query,
-        "gl": country.lower()
-    })
-    headers = {
-        'X-API-KEY': SERPER_API_KEY,
-        'Content-Type': 'application/json'
-    }
-    response = requests.post(url, headers=headers, data=payload)
-    if response.status_code != 200:
-        return {"error": f"Serper API error: {response.status_code} - {response.text}", "results": []}
-    shopping_results = response.json().get("shopping", [])
-    shopping_results = shopping_results[:41]
-    return {"error": None, "results": shopping_results}
-
-def format_results_for_csv(product_title, model_number, results, error=None):
-    rows = []
-    if error:
-        return [{"Product Title": product_title, "Model Number": model_number, "Error": error}]
-    for r in results:
-        rows.append({
-            "Product Title": product_title,
-            "Model Number": model_number,
-            "Title": r.get("title", ""),
-            "Source": r.get("source", ""),
-            "Link": r.get("link", ""),
-            "Price": r.get("price", ""),
-            "Rating": r.get("rating", ""),
-            "RatingCount": r.get("ratingCount", ""),
-            "ImageURL": r.get("imageUrl", "")
-        })
-    return rows
-
-def count_tokens(text: str, model_name: str = "gpt-3.5-turbo"):
-    try:
-        enc = tiktoken.encoding_for_model(model_name)
-    except KeyError:
-        enc = tiktoken.get_encoding("cl100k_base")
-    tokens = enc.encode(text)
-    return len(tokens)
-
-def get_links_matching_identifier(data: list, identifier: str):
-    prompt = f"""
-You are a filtering assistant. Given the following product search results, extract only the links that clearly match the product identifier: "{identifier}".
-
-Each item has: title, source, link.
-
-Return your answer ONLY as a JSON array in this format:
-[
-  {{"title": "...", "source": "...", "link": "..." }},
-  ...
-]
-
-Do NOT include any explanation. Just the JSON array.
-
-Input:
-{json.dumps(data[:20], indent=2)}
-"""
-    tokens_used = count_tokens(prompt, model_name="llama3-70b-8192")
-    st.write(f"⚡ Estimated tokens in prompt: {tokens_used}")
-
-    response = groq_client.chat.completions.create(
-        model="llama3-70b-8192",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3,
-    )
-
-    raw_response = response.choices[0].message.content.strip()
-
-    st.markdown("### 🧪 Raw LLM Response")
-    st.code(raw_response, language="json")
-
-    try:
-        matches = json.loads(raw_response)
-    except Exception as e:
-        st.error(f"❌ Failed to parse LLM response: {e}")
-        matches = []
+def get_links_matching_identifier(data: list, identifier: str, verbose: bool = True):
+    outcome = lazy_import("utils.link_filter").filter_links_by_identifier(data, identifier)
+
+    if verbose:
+        st.write(
+            f"🧮 Decided locally: {outcome.accepted_locally} accepted, {outcome.rejected_locally} rejected, "
+            f"{outcome.sent_to_llm} sent to LLM"
+        )
+        if outcome.cached:
+            st.info(f"♻️ Reused cached LLM filter result (saved ~{outcome.prompt_tokens + outcome.completion_tokens} tokens)")
+        elif outcome.sent_to_llm:
+            st.write(f"⚡ Tokens in prompt: {outcome.prompt_tokens}")
+            st.markdown("### 🧪 Raw LLM Response")
+            st.code(outcome.raw_response, language="json")
+
+    if outcome.error:
+        if verbose:
+            st.error(f"❌ {outcome.error}")
+        else:
+            print(f"{outcome.error} ({identifier})")
 
-    return matches
+    return outcome.indices
 
 # --- Streamlit UI ---
 st.set_page_config(page_title="🛒 Product Data Fetching and Filtering", layout="wide")
 st.title("🛍️ Product Data Fetching and Filtering with Model Number")
+warm_up_in_background(HEAVY_MODULES)
 
 tabs = st.tabs(["🔎 Search Single Product", "📂 Bulk Upload & Filter"])
 
@@ -117,6 +60,7 @@ with tabs[0]:
             st.warning("Please enter both product name and model number.")
         else:
             with st.spinner("Searching Serper..."):
+                pd = lazy_import("pandas")
                 result = search_serper_shopping(product_name, country_code)
                 if result["error"]:
                     st.error(result["error"])
@@ -138,19 +82,13 @@ with tabs[0]:
                     )
 
                     # Filter with LLM
-                    matches = get_links_matching_identifier(
+                    matched = get_links_matching_identifier(
                         full_df[["Title", "Source", "Link"]].to_dict(orient="records"),
                         model_number
                     )
                     filtered_df = pd.DataFrame()
-                    if matches:
-                        filtered_df = pd.merge(
-                            pd.DataFrame(matches),
-                            full_df,
-                            left_on=["title", "source", "link"],
-                            right_on=["Title", "Source", "Link"],
-                            how="inner"
-                        )[full_df.columns]
+                    if matched:
+                        filtered_df = full_df.iloc[matched]
 
                         st.success(f"LLM filtered {len(filtered_df)} relevant links.")
                         st.markdown("### ✅ Filtered Results")
@@ -172,69 +110,66 @@ with tabs[1]:
     st.subheader("📂 Upload CSV with columns: Product Title, Model Number, Country Code")
 
     uploaded_file = st.file_uploader("Upload CSV", type=["csv"])
+    if "bulk_job_ids" not in st.session_state:
+        st.session_state.bulk_job_ids = []
+
+    conc_col1, conc_col2 = st.columns(2)
+    with conc_col1:
+        search_concurrency = st.number_input("Concurrent Serper calls", min_value=1, max_value=64, value=SEARCH_CONCURRENCY)
+    with conc_col2:
+        filter_concurrency = st.number_input("Concurrent Groq calls", min_value=1, max_value=32, value=FILTER_CONCURRENCY)
+    batch_filter = st.checkbox("Batch several products per LLM filter call", value=FILTER_BATCH_SIZE > 1)
 
     if st.button("Run Bulk Fetch and Filter"):
         if not uploaded_file:
             st.warning("Please upload a CSV file.")
         else:
+            pd = lazy_import("pandas")
             df_input = pd.read_csv(uploaded_file)
             required_cols = ["Product Title", "Model Number", "Country Code"]
             if not all(col in df_input.columns for col in required_cols):
                 st.error(f"CSV must include these columns: {required_cols}")
             else:
-                all_full_rows = []
-                all_filtered_rows = []
-                total = len(df_input)
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-
-                for i, row in df_input.iterrows():
-                    product_title = str(row["Product Title"]).strip()
-                    model_number = str(row["Model Number"]).strip()
-                    country_code = str(row["Country Code"]).strip() or "us"
-
-                    status_text.text(f"Processing {i+1}/{total}: {product_title} ({model_number})")
-
-                    query = f"{product_title} {model_number}"
-                    result = search_serper_shopping(query, country_code)
-                    full_rows = format_results_for_csv(product_title, model_number, result["results"], result["error"])
-                    all_full_rows.extend(full_rows)
-
-                    # Filter results using LLM
-                    data_to_filter = [{"title": r["Title"], "source": r["Source"], "link": r["Link"]}
-                                      for r in full_rows if "Error" not in r]
-                    filtered = get_links_matching_identifier(data_to_filter, model_number)
-                    if filtered:
-                        full_df = pd.DataFrame(full_rows)
-                        filtered_df = pd.merge(
-                            pd.DataFrame(filtered),
-                            full_df,
-                            left_on=["title", "source", "link"],
-                            right_on=["Title", "Source", "Link"],
-                            how="inner"
-                        )[full_df.columns]
-                        all_filtered_rows.extend(filtered_df.to_dict(orient="records"))
-                    else:
-                        all_filtered_rows.extend(full_rows)  # fallback
-
-                    progress_bar.progress((i + 1) / total)
-
-                progress_bar.empty()
-                status_text.text("✅ Bulk fetch and filtering completed.")
-
-                df_all = pd.DataFrame(all_full_rows)
-                st.markdown("### 📊 All Fetched Results")
-                st.dataframe(df_all)
-                full_csv = io.StringIO()
-                df_all.to_csv(full_csv, index=False)
-                st.download_button("📥 Download All Fetched Results CSV", full_csv.getvalue().encode(), "bulk_all_results.csv", mime="text/csv")
-
-                df_filtered = pd.DataFrame(all_filtered_rows)
-                st.markdown("### ✅ Filtered Results")
-                st.dataframe(df_filtered)
-                filtered_csv = io.StringIO()
-                df_filtered.to_csv(filtered_csv, index=False)
-                st.download_button("📥 Download Filtered Results CSV", filtered_csv.getvalue().encode(), "bulk_filtered_results.csv", mime="text/csv")
+                rows = [{
+                    "Product Title": str(row["Product Title"]).strip(),
+                    "Model Number": str(row["Model Number"]).strip(),
+                    "Country Code": str(row["Country Code"]).strip() or "us",
+                } for _, row in df_input.iterrows()]
+                # Runs in a background worker; finished rows are checkpointed, so resubmitting the same file resumes
+                job_id = submit_job("bulk_fetch_filter", rows, {
+                    "search_concurrency": search_concurrency,
+                    "filter_concurrency": filter_concurrency,
+                    "batch_filter": batch_filter,
+                })
+                if job_id not in st.session_state.bulk_job_ids:
+                    st.session_state.bulk_job_ids.insert(0, job_id)
+                st.success(f"Queued {len(rows)} rows. You can keep using the app while the job runs.")
+
+    def render_bulk_result(entry):
+        pd = lazy_import("pandas")
+        results = job_results(entry["job_id"])
+        all_full_rows = []
+        all_filtered_rows = []
+        for position in sorted(results):
+            full_rows, filtered_rows = results[position]
+            all_full_rows.extend(full_rows)
+            all_filtered_rows.extend(filtered_rows)
+
+        df_all = pd.DataFrame(all_full_rows)
+        st.markdown("### 📊 All Fetched Results")
+        st.dataframe(df_all)
+        full_csv = io.StringIO()
+        df_all.to_csv(full_csv, index=False)
+        st.download_button("📥 Download All Fetched Results CSV", full_csv.getvalue().encode(), "bulk_all_results.csv", mime="text/csv", key=f"all_{entry['job_id']}")
+
+        df_filtered = pd.DataFrame(all_filtered_rows)
+        st.markdown("### ✅ Filtered Results")
+        st.dataframe(df_filtered)
+        filtered_csv = io.StringIO()
+        df_filtered.to_csv(filtered_csv, index=False)
+        st.download_button("📥 Download Filtered Results CSV", filtered_csv.getvalue().encode(), "bulk_filtered_results.csv", mime="text/csv", key=f"filtered_{entry['job_id']}")
+
+    show_jobs_panel(st.session_state.bulk_job_ids, render_bulk_result)
 
 
 # --- Tab 3: AI Generated Columns (Expander) ---
@@ -251,6 +186,9 @@ with st.expander("🤖 Append AI-Generated Data to Filtered CSV"):
         if not filtered_csv_file or not ai_template_file:
             st.warning("Please upload both CSV files.")
         else:
+            pd = lazy_import("pandas")
+            metadata_generator = lazy_import("utils.metadata_generator")
+            METADATA_FIELDS = metadata_generator.METADATA_FIELDS
             filtered_df = pd.read_csv(filtered_csv_file)
             ai_template_df = pd.read_csv(ai_template_file)
 
@@ -259,70 +197,39 @@ with st.expander("🤖 Append AI-Generated Data to Filtered CSV"):
             else:
                 merged_df = filtered_df.merge(ai_template_df, on="Model Number", how="left", suffixes=("", "_ai"))
 
-                new_category = []
-                new_description = []
-                new_keywords = []
-                new_meta_title = []
+                # Rows whose AI fields are already filled are reused as-is
+                ai_values = merged_df.reindex(columns=METADATA_FIELDS).astype(object)
+                filled = ai_values.notna().all(axis=1)
 
-                prompt_template = """
-You are an AI assistant that generates product metadata.
+                titles = pd.Series("", index=merged_df.index)
+                for column in ("Product Title", "Title"):  # "Title" wins when both are set
+                    if column in merged_df.columns:
+                        values = merged_df[column].fillna("").astype(str)
+                        titles = values.where(values.str.strip() != "", titles)
 
-Given product details:
+                # One generation per product (Model Number + normalised title), not per offer row
+                todo = pd.DataFrame({
+                    "Model Number": merged_df["Model Number"].fillna("").astype(str),
+                    "_title": titles,
+                    "_product_key": titles.str.lower().str.split().str.join(" "),
+                })[~filled]
+                products = todo.drop_duplicates(["Model Number", "_product_key"])
 
-Product Title: {title}
-    
-Generate:
+                with st.spinner(f"Generating metadata for {len(products)} unique products ({len(todo)} rows)..."):
+                    generated = metadata_generator.generate_metadata_batch(products["_title"].tolist())
 
-1. Category (short phrase)
-2. SEO-friendly Technical Description in 5 lines (in bullet points)
-3. Keywords (comma-separated)
-4. Meta Title (SEO optimized)
+                for model_num, data_json in zip(products["Model Number"], generated):
+                    if data_json is None:
+                        st.warning(f"AI generation failed for product {model_num}")
 
-Return the answer as JSON with keys: Category, Description, Keywords, MetaTitle.
-"""
+                generated_df = pd.DataFrame([data_json or {} for data_json in generated], columns=METADATA_FIELDS)
+                generated_df["Model Number"] = products["Model Number"].to_numpy()
+                generated_df["_product_key"] = products["_product_key"].to_numpy()
 
-                for idx, row in merged_df.iterrows():
-                    # If AI fields already filled, reuse
-                    if pd.notna(row.get("Category")) and pd.notna(row.get("Description")) and pd.notna(row.get("Keywords")) and pd.notna(row.get("MetaTitle")):
-                        new_category.append(row["Category"])
-                        new_description.append(row["Description"])
-                        new_keywords.append(row["Keywords"])
-                        new_meta_title.append(row["MetaTitle"])
-                        continue
-
-                    title = row.get("Title") or row.get("Product Title") or ""
-                    model_num = row.get("Model Number") or ""
-
-                    prompt = prompt_template.format(title=title, model_number=model_num)
-
-                    try:
-                        response = groq_client.chat.completions.create(
-                            model="llama3-70b-8192",
-                            messages=[{"role": "user", "content": prompt}],
-                            temperature=0.3,
-                        )
-                        content = response.choices[0].message.content.strip()
-                        # Parse JSON from response (some LLMs return text with explanation, so attempt best effort)
-                        json_start = content.find("{")
-                        json_end = content.rfind("}") + 1
-                        json_str = content[json_start:json_end]
-                        data_json = json.loads(json_str)
-
-                        new_category.append(data_json.get("Category", ""))
-                        new_description.append(data_json.get("Description", ""))
-                        new_keywords.append(data_json.get("Keywords", ""))
-                        new_meta_title.append(data_json.get("MetaTitle", ""))
-                    except Exception as e:
-                        st.warning(f"AI generation failed for row {idx} ({model_num}): {e}")
-                        new_category.append("")
-                        new_description.append("")
-                        new_keywords.append("")
-                        new_meta_title.append("")
-
-                merged_df["Category"] = new_category
-                merged_df["Description"] = new_description
-                merged_df["Keywords"] = new_keywords
-                merged_df["MetaTitle"] = new_meta_title
+                # Broadcast each product's metadata to all of its rows
+                broadcast = todo.merge(generated_df, on=["Model Number", "_product_key"], how="left")
+                ai_values.loc[todo.index, METADATA_FIELDS] = broadcast[METADATA_FIELDS].fillna("").to_numpy()
+                merged_df[METADATA_FIELDS] = ai_values
 
                 st.markdown("### 📄 AI-Enhanced Data Preview")
                 st.dataframe(merged_df.head(10))
@@ -371,3 +278,66 @@ help_text = """
 
 st.sidebar.markdown(help_text)
 
+# Stats only for subsystems that are already loaded; the sidebar never triggers an import.
+# They count this app process; bulk jobs run in worker processes and report in the jobs panel.
+st.sidebar.caption("Counters below cover this app only; bulk jobs show their own stats in the jobs panel.")
+with st.sidebar.expander("🗄️ Serper cache"):
+    if not is_loaded("utils.serper_client"):
+        st.write("Not loaded yet.")
+    else:
+        cache_stats = lazy_import("utils.serper_client").serper_cache_stats()
+        st.metric("Hit rate", f"{cache_stats['hit_rate']:.0%}")
+        st.write(f"Hits: {cache_stats['hits']} · Misses: {cache_stats['misses']} · Coalesced: {cache_stats['coalesced']}")
+        st.write(f"Entries: {cache_stats['entries']} · Size: {cache_stats['bytes'] / 1024 / 1024:.1f} / {cache_stats['max_bytes'] / 1024 / 1024:.0f} MB")
+        st.write(f"Evictions: {cache_stats['evictions']} · Expired: {cache_stats['expired']}")
+
+with st.sidebar.expander("🩺 Serper health"):
+    if not is_loaded("utils.serper_client"):
+        st.write("Not loaded yet.")
+    else:
+        for endpoint, health in lazy_import("utils.serper_client").serper_resilience_stats().items():
+            p95 = f"{health['p95_ms']} ms" if health["p95_ms"] is not None else "warming up"
+            st.write(
+                f"**{endpoint}** · breaker {health['state']} (opened {health['times_opened']}×) · p95 {p95} · "
+                f"hedged {health['hedge_rate']:.0%} ({health['hedge_wins']} wins) · "
+                f"{health['short_circuited']} failed fast · {health['stale_served']} stale served"
+            )
+
+with st.sidebar.expander("🧠 LLM filter cache"):
+    if not is_loaded("utils.link_filter"):
+        st.write("Not loaded yet.")
+    else:
+        filter_stats = lazy_import("utils.link_filter").link_filter_stats()
+        st.write(f"LLM calls: {filter_stats['llm_calls']} · Cache hits: {filter_stats['cache_hits']}")
+        st.write(f"Tokens saved: {filter_stats['prompt_tokens_saved'] + filter_stats['completion_tokens_saved']}")
+        st.write(
+            f"Rows decided locally: {filter_stats['rows_accepted_locally'] + filter_stats['rows_rejected_locally']} · "
+            f"Sent to LLM: {filter_stats['rows_sent_to_llm']}"
+        )
+
+with st.sidebar.expander("🚦 Rate limits"):
+    if not is_loaded("utils.rate_limiter"):
+        st.write("Not loaded yet.")
+    else:
+        for provider, limiter_stats in lazy_import("utils.rate_limiter").rate_limiter_stats().items():
+            st.write(
+                f"**{provider}** · in flight {limiter_stats['in_flight']}/{limiter_stats['limit']} "
+                f"(max {limiter_stats['max_concurrency']}) · {limiter_stats['calls']} calls · "
+                f"{limiter_stats['rate_limited']} × 429, {limiter_stats['retries']} retries · "
+                f"waited {limiter_stats['waited_s']:.1f}s"
+            )
+
+with st.sidebar.expander("📏 Token usage"):
+    for model_name, usage in token_usage_report().items():
+        st.write(
+            f"**{model_name}** · {usage['calls']} calls · prompt {usage['actual_prompt']} actual / "
+            f"{usage['estimated_prompt']} estimated ({usage['actual_to_estimated']:.2f}x) · "
+            f"completion {usage['completion']}"
+        )
+
+with st.sidebar.expander("⏱️ Startup report"):
+    report = import_report()
+    if not report:
+        st.write("Nothing loaded yet.")
+    for module_name, ms in report:
+        st.write(f"`{module_name}`: {ms:.0f} ms")
@@ -0,0 +1,36 @@
+import asyncio
+
+from utils.batch_runner import arun_deduplicated, dedupe_key, dedupe_queries
+
+
+def test_dedupe_key_ignores_case_and_whitespace():
+    assert dedupe_key("  Find  B08N5WRWNW ") == dedupe_key("find b08n5wrwnw")
+
+
+def test_dedupe_queries_maps_rows_to_unique_queries():
+    unique, row_to_unique = dedupe_queries(["A", "b", "a ", None, "", "B", "c"])
+    assert unique == ["A", "b", "c"]  # first spelling wins
+    assert row_to_unique == [0, 1, 0, None, None, 1, 2]
+
+
+def test_arun_deduplicated_runs_each_query_once_and_fans_out():
+    calls, progress = [], []
+
+    async def run(query):
+        calls.append(query)
+        await asyncio.sleep(0.01)
+        if query == "bad":
+            raise RuntimeError("lookup failed")
+        return query.upper()
+
+    results = asyncio.run(arun_deduplicated(
+        ["x", "y", "X", None, "bad", "y"],
+        run,
+        concurrency=2,
+        on_progress=lambda done, total, saved: progress.append((done, total, saved)),
+    ))
+    assert sorted(calls) == ["bad", "x", "y"]
+    assert results[:4] == ["X", "Y", "X", None]
+    assert isinstance(results[4], RuntimeError)
+    assert results[5] == "Y"
+    assert progress[-1] == (3, 3, 2)
@@ -0,0 +1,60 @@
+import random
+import time
+
+from utils.bulk_pipeline import run_fetch_filter_pipeline
+
+
+def _jittered(value):
+    time.sleep(random.uniform(0, 0.01))
+    return value
+
+
+def test_results_come_back_in_input_order():
+    items = list(range(40))
+    results = run_fetch_filter_pipeline(
+        items,
+        fetch=lambda item: _jittered(item * 10),
+        filter_=lambda item, fetched: _jittered(fetched + 1),
+        search_concurrency=8,
+        filter_concurrency=3,
+    )
+    assert results == [(item * 10, item * 10 + 1) for item in items]
+
+
+def test_batched_filter_matches_per_row_filter():
+    items = list(range(23))
+    batch_sizes = []
+
+    def filter_batch(batch_items, fetched_list):
+        batch_sizes.append(len(batch_items))
+        return [fetched + 1 for fetched in fetched_list]
+
+    results = run_fetch_filter_pipeline(
+        items,
+        fetch=lambda item: _jittered(item * 10),
+        search_concurrency=8,
+        filter_batch=filter_batch,
+        batch_size=5,
+    )
+    assert results == [(item * 10, item * 10 + 1) for item in items]
+    assert sum(batch_sizes) == len(items)
+    assert max(batch_sizes) <= 5
+
+
+def test_callbacks_see_every_row_once():
+    progress, finished = [], {}
+    results = run_fetch_filter_pipeline(
+        ["a", "b", "c"],
+        fetch=str.upper,
+        filter_=lambda item, fetched: fetched * 2,
+        on_progress=lambda done, total, item: progress.append((done, total)),
+        on_result=lambda index, result: finished.setdefault(index, result),
+    )
+    assert results == [("A", "AA"), ("B", "BB"), ("C", "CC")]
+    assert finished == dict(enumerate(results))
+    assert [done for done, _ in progress] == [1, 2, 3]
+    assert all(total == 3 for _, total in progress)
+
+
+def test_empty_input():
+    assert run_fetch_filter_pipeline([], fetch=lambda item: item) == []
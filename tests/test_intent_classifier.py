@@ -0,0 +1,38 @@
+import pytest
+
+from agents.intent_classifier import SHOPPING, WEB, LocalIntentClassifier
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return LocalIntentClassifier()
+
+
+@pytest.mark.parametrize("query", [
+    "Find product info for identifier: B08N5WRWNW",
+    "what is this B07XJ8C8F5",
+    "who sells 0306406152",
+    "lookup 4006381333931",
+])
+def test_identifier_codes_go_to_web(classifier, query):
+    assert classifier._rules(query) == ([WEB], 1.0)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Write an SEO description for these headphones", ([SHOPPING], 0.9)),
+    ("what is the price of a dishwasher", None),
+    ("HEADPHONES are great", None),
+    ("b08n5wrwnw in lower case", None),
+])
+def test_ten_letter_words_are_not_asins(classifier, query, expected):
+    assert classifier._rules(query) == expected
+
+
+def test_structured_lookups(classifier):
+    assert classifier._rules("Find product info for product title: Dell U2723QE") == ([SHOPPING], 1.0)
+
+
+def test_keyword_rules(classifier):
+    assert classifier._rules("give me keywords for this blender") == ([SHOPPING], 0.9)
+    assert classifier._rules("search the web for this discontinued lens") == ([WEB], 0.9)
+    assert classifier._rules("search the web and write a meta title") == ([SHOPPING, WEB], 0.9)
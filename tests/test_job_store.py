@@ -0,0 +1,110 @@
+import sqlite3
+
+import pytest
+
+from utils.job_store import JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite"))
+
+
+def test_same_input_resumes_from_its_checkpoints(store):
+    job = store.open_job("bulk", ["a", "b", "a"])
+    job.save(0, {"ok": "a"})
+
+    resumed = store.open_job("bulk", ["a", "b", "a"])
+    assert resumed.job_id == job.job_id
+    assert resumed.completed() == {0: {"ok": "a"}, 2: {"ok": "a"}}
+    assert store.open_job("bulk", ["a", "b"]).completed() == {}
+
+
+def test_failed_rows_are_shown_but_retried(store):
+    job = store.open_job("bulk", ["a", "b"])
+    job.save(0, {"ok": True})
+    job.save(1, {"error": "timeout"}, failed=True)
+
+    assert job.completed() == {0: {"ok": True}}
+    assert job.results() == {0: {"ok": True}, 1: {"error": "timeout"}}
+
+
+def test_expired_job_starts_over(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"), max_age=-1)
+    store.open_job("bulk", ["a"]).save(0, {"ok": True})
+    assert store.open_job("bulk", ["a"]).completed() == {}
+
+
+def test_expired_job_keeps_checkpoints_and_queue_row_while_active(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"), max_age=-1)
+    job_id = store.enqueue("batch_lookup", ["a", "b"])
+    store.claim_next(111)
+    job, _ = store.load_job(job_id)
+    job.save(0, {"ok": True})
+
+    assert store.open_job("batch_lookup", ["a", "b"]).completed() == {0: {"ok": True}}
+    assert [(entry["job_id"], entry["status"]) for entry in store.queued_jobs()] == [(job_id, "running")]
+
+
+def test_old_checkpoint_file_drops_the_jobs_status_column(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE jobs (job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, total INTEGER NOT NULL, "
+        "status TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+    )
+    conn.close()
+
+    JobStore(path).open_job("bulk", ["a"]).save(0, {"ok": True})
+    assert JobStore(path).open_job("bulk", ["a"]).completed() == {0: {"ok": True}}
+
+
+def test_requeued_job_keeps_its_checkpoints(store):
+    job_id = store.enqueue("batch_lookup", ["a", "b"])
+    store.claim_next(111)
+    job, _ = store.load_job(job_id)
+    job.save(0, {"ok": True})
+
+    store.requeue_running([111])
+    claimed = store.claim_next(222)
+    job, _ = store.load_job(claimed["job_id"])
+    assert job.completed() == {0: {"ok": True}}
+
+
+def test_claim_next_takes_oldest_queued_job(store):
+    first = store.enqueue("batch_lookup", ["a", "b"], {"concurrency": 2})
+    second = store.enqueue("batch_lookup", ["c"])
+
+    claimed = store.claim_next(111)
+    assert claimed == {"job_id": first, "kind": "batch_lookup", "rows": ["a", "b"], "params": {"concurrency": 2}}
+    assert store.claim_next(222)["job_id"] == second
+    assert store.claim_next(333) is None
+
+    status = {entry["job_id"]: (entry["status"], entry["worker_pid"]) for entry in store.queued_jobs()}
+    assert status == {first: ("running", 111), second: ("running", 222)}
+
+
+def test_enqueue_same_rows_while_active_returns_existing_job(store):
+    job_id = store.enqueue("batch_lookup", ["a"])
+    assert store.enqueue("batch_lookup", ["a"]) == job_id
+    store.claim_next(111)
+    assert store.enqueue("batch_lookup", ["a"]) == job_id
+    assert store.claim_next(222) is None
+
+
+def test_requeue_running_only_touches_given_workers(store):
+    dead = store.enqueue("batch_lookup", ["a"])
+    alive = store.enqueue("batch_lookup", ["b"])
+    store.claim_next(111)
+    store.claim_next(222)
+    assert sorted(store.running_worker_pids()) == [111, 222]
+
+    store.requeue_running([111])
+    assert store.running_worker_pids() == [222]
+    claimed = store.claim_next(333)
+    assert claimed["job_id"] == dead
+    assert store.claim_next(444) is None
+
+    status = {entry["job_id"]: (entry["status"], entry["worker_pid"]) for entry in store.queued_jobs()}
+    assert status == {dead: ("running", 333), alive: ("running", 222)}
+
@@ -0,0 +1,41 @@
+import pytest
+
+from utils import link_filter, token_budget
+from utils.link_filter import parse_id_list
+
+
+@pytest.mark.parametrize("raw, size, expected", [
+    ("[0, 3]", 5, [0, 3]),
+    ("Matches: [3, 0, 3]", 5, [0, 3]),
+    ("[]", 5, []),
+    ("[1, 7, 4]", 5, [1, 4]),
+    ("```json\n[2]\n```", 3, [2]),
+])
+def test_parse_id_list(raw, size, expected):
+    assert parse_id_list(raw, size) == expected
+
+
+def test_parse_id_list_without_array_raises():
+    with pytest.raises(ValueError):
+        parse_id_list("none of them match", 5)
+
+
+class WordEncoding:
+    """Stands in for tiktoken, whose encodings are downloaded on first use."""
+
+    def encode(self, text):
+        return text.split()
+
+
+def test_failed_llm_call_returns_an_error_outcome(tmp_path, monkeypatch):
+    monkeypatch.setattr(token_budget, "get_encoding", lambda model_name: WordEncoding())
+    monkeypatch.setattr(link_filter, "_llm_cache", link_filter.ResponseCache(str(tmp_path / "llm.sqlite")))
+
+    def down(*args, **kwargs):
+        raise RuntimeError("503 from Groq")
+
+    monkeypatch.setattr(link_filter, "_complete", down)
+    data = [{"title": "Some monitor PD2705", "source": "shop"}, {"title": "PD 27 stand", "source": "shop"}]
+    outcome = link_filter.filter_links_by_identifier(data, "PD2705Q")
+    assert outcome.error and "503 from Groq" in outcome.error
+    assert outcome.indices == []
@@ -0,0 +1,63 @@
+import pytest
+
+from utils.llm_batching import pack_batches, parse_keyed_json, run_batched
+
+
+def test_pack_batches_respects_budget_and_item_cap():
+    assert pack_batches([3, 3, 3, 3], budget=7, max_items=8) == [[0, 1], [2, 3]]
+    assert pack_batches([1, 1, 1, 1, 1], budget=100, max_items=2) == [[0, 1], [2, 3], [4]]
+    assert pack_batches([50, 1], budget=10, max_items=8) == [[0], [1]]  # oversize item alone
+
+
+def test_parse_keyed_json():
+    assert parse_keyed_json('Sure: {"P0": [1], "P1": []} done') == {"P0": [1], "P1": []}
+    with pytest.raises(ValueError):
+        parse_keyed_json("no json here")
+
+
+class FakeLLM:
+    """Batch calls answer every item except those in `drop`; records every call."""
+
+    def __init__(self, drop=(), fail_batches=False):
+        self.drop = set(drop)
+        self.fail_batches = fail_batches
+        self.calls = []
+
+    def call_batch(self, batch):
+        self.calls.append(("batch", list(batch)))
+        if self.fail_batches:
+            raise RuntimeError("malformed answer")
+        return {position: item.upper() for position, item in enumerate(batch) if item not in self.drop}
+
+    def call_single(self, item):
+        self.calls.append(("single", item))
+        return item.upper()
+
+
+def _run(llm, items, max_items=8):
+    return run_batched(items, cost=lambda item: 1, call_batch=llm.call_batch, call_single=llm.call_single, budget=100, max_items=max_items)
+
+
+def test_missing_item_goes_straight_to_single():
+    llm = FakeLLM(drop={"b"})
+    assert _run(llm, ["a", "b", "c"]) == ["A", "B", "C"]
+    assert llm.calls == [("batch", ["a", "b", "c"]), ("single", "b")]
+
+
+def test_failed_batch_is_retried_at_half_size():
+    llm = FakeLLM(fail_batches=True)
+    assert _run(llm, ["a", "b", "c", "d"], max_items=4) == ["A", "B", "C", "D"]
+    kinds = [kind for kind, _ in llm.calls]
+    assert kinds == ["batch", "batch", "batch", "single", "single", "single", "single"]
+
+
+def test_single_item_never_batched():
+    llm = FakeLLM()
+    assert _run(llm, ["a"]) == ["A"]
+    assert llm.calls == [("single", "a")]
+
+
+def test_concurrent_rounds_keep_order():
+    llm = FakeLLM(drop={"b", "e"})
+    items = list("abcdefgh")
+    assert run_batched(items, lambda item: 1, llm.call_batch, llm.call_single, budget=100, max_items=3, concurrency=4) == [i.upper() for i in items]
@@ -0,0 +1,49 @@
+import pytest
+
+from utils.model_matcher import ACCEPT, AMBIGUOUS, REJECT, classify_title, normalize_model_number, prematch
+
+
+def test_normalize_drops_separators_and_case():
+    assert normalize_model_number("pd-2705 q") == "PD2705Q"
+    assert normalize_model_number("WH-1000XM5/B") == "WH1000XM5B"
+
+
+@pytest.mark.parametrize("title, identifier", [
+    ("BenQ PD2705Q 27 inch monitor", "PD2705Q"),
+    ("BenQ PD 2705 Q monitor", "pd-2705q"),
+    ("Logitech MX518 WH gaming mouse", "MX518"),  # title variant of the base model
+    ("Logitech MX518WH gaming mouse", "MX518WH"),
+    ("Logitech MX518 WH gaming mouse", "MX518WH"),
+])
+def test_accepts_model_in_title(title, identifier):
+    assert classify_title(title, identifier) == ACCEPT
+
+
+@pytest.mark.parametrize("title, identifier", [
+    ("Logitech MX518 black", "MX518WH"),
+    ("Logitech MX518 BK", "MX518WH"),
+    ("Logitech MX518WH", "MX518BK"),
+])
+def test_variants_do_not_accept_each_other(title, identifier):
+    assert classify_title(title, identifier) != ACCEPT
+
+
+def test_rejects_unrelated_title():
+    assert classify_title("Samsung Galaxy S24 Ultra 256GB", "PD2705Q") == REJECT
+
+
+def test_near_miss_is_left_for_the_llm():
+    assert classify_title("BenQ PD2705U 27 inch monitor", "PD2705Q") == AMBIGUOUS
+
+
+def test_short_identifiers_are_ambiguous():
+    assert classify_title("Apple X1 case", "X1") == AMBIGUOUS
+
+
+def test_prematch_splits_candidates():
+    data = [
+        {"title": "BenQ PD2705Q"},
+        {"title": "Samsung Galaxy S24"},
+        {"Title": "BenQ PD2705U"},
+    ]
+    assert prematch(data, "PD2705Q") == ([0], [1], [2])
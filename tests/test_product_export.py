@@ -0,0 +1,15 @@
+from utils.product_utils import ProductExport
+
+
+def test_csv_rows_end_with_newline_only():
+    export = ProductExport([{"Product Title": "Mouse", "Price": "$9"}, {"Product Title": "Pad", "Price": 4.5}])
+    assert export["csv"].read() == b"Product Title,Price\nMouse,$9\nPad,4.5\n"
+
+
+def test_export_hands_out_the_same_rewound_buffer():
+    export = ProductExport([{"Product Title": "Mouse"}])
+    first = export["csv"]
+    first.read()
+    second = export["csv"]
+    assert second is first
+    assert second.tell() == 0
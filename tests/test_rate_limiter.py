@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import pytest
+
+from utils import rate_limiter
+from utils.rate_limiter import ProviderLimiter, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    return clock
+
+
+def test_reserve_within_capacity_is_immediate(clock):
+    bucket = TokenBucket(60)  # 1 per second
+    assert bucket.reserve(60) == 0.0
+
+
+def test_reserve_into_debt_returns_wait(clock):
+    bucket = TokenBucket(60)
+    bucket.reserve(60)
+    assert bucket.reserve(3) == pytest.approx(3.0)
+    # Later callers queue behind the debt
+    assert bucket.reserve(1) == pytest.approx(4.0)
+
+
+def test_refill_over_time_caps_at_capacity(clock):
+    bucket = TokenBucket(60)
+    bucket.reserve(60)
+    clock.now += 10
+    assert bucket.reserve(10) == 0.0
+    clock.now += 3600
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+
+def test_reserve_larger_than_capacity_takes_capacity(clock):
+    bucket = TokenBucket(60)
+    assert bucket.reserve(1000) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+
+def test_refund_gives_back_and_negative_refund_charges(clock):
+    bucket = TokenBucket(60)
+    bucket.reserve(60)
+    bucket.refund(30)
+    assert bucket.reserve(30) == 0.0
+    bucket.refund(-5)
+    assert bucket.reserve(0) == pytest.approx(5.0)
+
+
+def test_refund_does_not_exceed_capacity(clock):
+    bucket = TokenBucket(60)
+    bucket.refund(100)
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+
+def test_call_settles_reservation_on_chat_result_usage(clock):
+    limiter = ProviderLimiter("openai", rpm=0, tpm=1000, max_concurrency=2)
+    chat_result = SimpleNamespace(llm_output={"token_usage": {"total_tokens": 100}})
+
+    assert limiter.call(lambda: chat_result, tokens=400) is chat_result
+    assert limiter.tokens.reserve(0) == 0.0
+    assert limiter.tokens._level == 900
+
+
+def test_rate_limited_call_halves_in_flight_limit_and_retries(clock, monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda seconds: None)
+    limiter = ProviderLimiter("openai", rpm=0, tpm=0, max_concurrency=8)
+    attempts = []
+
+    def send():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("rate limited") from None
+        return "ok"
+
+    monkeypatch.setattr(rate_limiter, "is_rate_limited", lambda error: True)
+    assert limiter.call(send) == "ok"
+    assert len(attempts) == 2
+    assert limiter.stats()["limit"] == 4
+
@@ -0,0 +1,143 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from utils import resilience
+from utils.resilience import CircuitBreaker, CircuitOpenError, HedgeSkipped, LatencyTracker, ResilientEndpoint
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.times_opened == 1
+    assert not breaker.allow()
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_half_open_allows_a_single_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 29
+    assert not breaker.allow()
+    clock[0] += 1
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()  # the probe is still out
+
+
+def test_successful_probe_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.times_opened == 2
+    assert not breaker.allow()
+    clock[0] += 30
+    assert breaker.allow()
+
+
+def _warm_endpoint(p95=0.01):
+    endpoint = ResilientEndpoint("test", CircuitBreaker(), LatencyTracker(min_samples=1), hedge_max_rate=1.0)
+    endpoint.latency.add(p95)
+    return endpoint
+
+
+def test_hedge_answers_a_slow_call():
+    endpoint = _warm_endpoint()
+
+    def slow():
+        time.sleep(0.3)
+        return "primary"
+
+    assert endpoint.call(slow, lambda settled: "hedge") == "hedge"
+    assert endpoint.stats()["hedge_wins"] == 1
+
+
+def test_hedge_waiting_past_the_answer_is_not_sent():
+    endpoint = _warm_endpoint()
+    sent = []
+
+    def primary():
+        time.sleep(0.05)
+        return "primary"
+
+    def hedge(settled):
+        time.sleep(0.1)  # e.g. queued behind the rate limiter
+        if settled.is_set():
+            raise HedgeSkipped()
+        sent.append("hedge")
+        return "hedge"
+
+    assert endpoint.call(primary, hedge) == "primary"
+    time.sleep(0.15)
+    assert sent == []
+
+
+def test_cancelled_async_caller_cancels_the_primary():
+    endpoint = _warm_endpoint(p95=1.0)
+    cancelled = []
+
+    async def send():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def main():
+        call = asyncio.ensure_future(endpoint.acall(send))
+        await asyncio.sleep(0.01)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert cancelled == [True]
+
+
+def test_open_breaker_fails_fast():
+    endpoint = ResilientEndpoint("test", CircuitBreaker(failure_threshold=1), LatencyTracker(), hedge=False)
+
+    def down():
+        raise httpx.ConnectTimeout("timed out")
+
+    with pytest.raises(httpx.ConnectTimeout):
+        endpoint.call(down)
+    with pytest.raises(CircuitOpenError):
+        endpoint.call(lambda: "never sent")
+    assert endpoint.stats()["short_circuited"] == 1
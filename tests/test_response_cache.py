@@ -0,0 +1,114 @@
+import asyncio
+import secrets
+import threading
+import time
+
+import pytest
+
+from utils.response_cache import ResponseCache, make_cache_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "cache.sqlite"))
+
+
+def test_make_cache_key_is_order_independent_for_dicts():
+    assert make_cache_key("search", {"q": "a", "gl": "us"}) == make_cache_key("search", {"gl": "us", "q": "a"})
+    assert make_cache_key("search", {"q": "a"}) != make_cache_key("search", {"q": "b"})
+
+
+def test_get_set_and_ttl(cache):
+    cache.set("search", "k", {"items": [1, 2]})
+    assert cache.get("search", "k") == {"items": [1, 2]}
+    cache.set("search", "old", 1, ttl=-1)
+    assert cache.get("search", "old", "missing") == "missing"
+    assert cache.stats()["expired"] == 1
+
+
+def test_lru_eviction_keeps_recently_read_entries(tmp_path):
+    # Random hex barely compresses, so each entry is ~220 bytes
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=1000)
+    for n in range(3):
+        cache.set("search", f"k{n}", secrets.token_hex(200))
+        time.sleep(0.01)
+    cache.get("search", "k0")  # k1 is now the least recently used
+    time.sleep(0.01)
+    for n in range(3, 6):
+        cache.set("search", f"k{n}", secrets.token_hex(200))
+        time.sleep(0.01)
+    stats = cache.stats()
+    assert stats["bytes"] <= 1000
+    assert stats["evictions"] > 0
+    assert cache.get("search", "k1") is None
+    assert cache.get("search", "k0") is not None
+    assert cache.get("search", "k5") is not None
+
+
+def test_get_or_fetch_collapses_concurrent_misses(cache):
+    calls = []
+    started = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        time.sleep(0.05)
+        return {"value": 42}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch("search", "k", fetch))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [{"value": 42}] * 5
+    assert len(calls) == 1
+    assert cache.get_or_fetch("search", "k", fetch) == {"value": 42}
+    assert len(calls) == 1
+
+
+def test_get_or_fetch_errors_reach_followers_and_are_not_cached(cache):
+    def fetch():
+        time.sleep(0.02)
+        raise RuntimeError("upstream down")
+
+    errors = []
+
+    def run():
+        try:
+            cache.get_or_fetch("search", "k", fetch)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=run) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == ["upstream down"] * 3
+    assert cache.get("search", "k") is None
+
+
+def test_uncacheable_values_are_returned_but_not_stored(cache):
+    assert cache.get_or_fetch("search", "k", lambda: {"error": True}, cacheable=lambda v: "error" not in v) == {"error": True}
+    assert cache.get("search", "k") is None
+
+
+def test_cancelled_async_leader_does_not_fail_followers(cache):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def main():
+        leader = asyncio.ensure_future(cache.aget_or_fetch("search", "k", fetch))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(cache.aget_or_fetch("search", "k", fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == "value"
+    assert len(calls) == 2  # the follower took over the fetch
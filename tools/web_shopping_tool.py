@@ -1,44 +1,39 @@
-from langchain.tools import tool
-import requests
+from langchain.tools import StructuredTool
 from typing import List, Dict
-import json
 from dotenv import load_dotenv
+import asyncio
 import os
-from tools.web_ean_asin_tool import search_web_ean_asin
-from tools.shopping_tool import search_shopping
+from rapidfuzz import fuzz
+from tools.web_ean_asin_tool import fetch_web_ean_asin, afetch_web_ean_asin
+from tools.shopping_tool import fetch_shopping_results, afetch_shopping_results
 # Load environment variables
 load_dotenv()
 SERPER_API_KEY = os.getenv("SERPER_API_KEY")   # You may want to move this to .env
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Start a shopping search on the raw code alongside the web lookup (async path only)
+COMBINED_SPECULATIVE = os.getenv("COMBINED_SPECULATIVE", "1").lower() in ("1", "true", "yes")
+# Raw-code shopping results are only used when their top title matches the resolved title this well
+SPECULATIVE_MATCH_SCORE = float(os.getenv("SPECULATIVE_MATCH_SCORE", "70"))
 
 
+def _title_not_usable(code_or_name: str, web_result: Dict) -> List[Dict]:
+    return [{
+        "Product Title": web_result.get("Product Title", "") or code_or_name,
+        "Description": web_result.get("Description", ""),
+        "Price": "Not available",
+        "Link": web_result.get("Link", ""),
+        "Note": "No valid product title found for shopping search. Showing web search result only."
+    }]
 
-@tool
-def search_product_combined(code_or_name: str) -> List[Dict]:
-    """Combine web and shopping search to return enriched product information."""
-    web_results = search_web_ean_asin(code_or_name)
-
-    if "error" in web_results[0]:
-        return web_results
-
-    product_title = web_results[0].get("Product Title", "")
-    product_link = web_results[0].get("Link", "")
 
-    if not product_title or len(product_title) < 3:
-        return [{
-            "Product Title": product_title or code_or_name,
-            "Description": web_results[0].get("Description", ""),
-            "Price": "Not available",
-            "Link": product_link,
-            "Note": "No valid product title found for shopping search. Showing web search result only."
-        }]
-
-    shopping_results = search_shopping(product_title)
+def _enrich(web_result: Dict, shopping_results: List[Dict]) -> List[Dict]:
+    product_title = web_result.get("Product Title", "")
+    product_link = web_result.get("Link", "")
 
     if isinstance(shopping_results, list) and shopping_results and "error" in shopping_results[0]:
         return [{
             "Product Title": product_title,
-            "Description": web_results[0].get("Description", ""),
+            "Description": web_result.get("Description", ""),
             "Price": "Not available",
             "Link": product_link,
             "Note": shopping_results[0]["error"]
@@ -50,3 +45,85 @@ def search_product_combined(code_or_name: str) -> List[Dict]:
         enriched_results.append(item)
 
     return enriched_results
+
+
+def fetch_product_combined(code_or_name: str) -> List[Dict]:
+    """Combine web and shopping search to return enriched product information."""
+    web_results = fetch_web_ean_asin(code_or_name)
+
+    if "error" in web_results[0]:
+        return web_results
+
+    product_title = web_results[0].get("Product Title", "")
+    if not product_title or len(product_title) < 3:
+        return _title_not_usable(code_or_name, web_results[0])
+
+    return _enrich(web_results[0], fetch_shopping_results(product_title))
+
+
+def _speculative_hit(raw_task: asyncio.Future, product_title: str) -> bool:
+    """True when the raw-code shopping search finished with results for `product_title`."""
+    if not raw_task.done() or raw_task.cancelled() or raw_task.exception() is not None:
+        return False
+    shopping_results = raw_task.result()
+    if not shopping_results or "error" in shopping_results[0]:
+        return False
+    top_title = shopping_results[0].get("Product Title", "")
+    return fuzz.token_set_ratio(product_title.lower(), top_title.lower()) >= SPECULATIVE_MATCH_SCORE
+
+
+async def _afetch_product_speculative(code_or_name: str) -> List[Dict]:
+    """
+    Web lookup and a shopping search on the raw code run together. Once the
+    title is resolved, the title search starts and the first result set that
+    is valid for that title wins, so a lookup costs about one Serper round
+    trip instead of two.
+    """
+    raw_task = asyncio.ensure_future(afetch_shopping_results(code_or_name))
+    try:
+        web_results = await afetch_web_ean_asin(code_or_name)
+        if "error" in web_results[0]:
+            return web_results
+
+        product_title = web_results[0].get("Product Title", "")
+        if not product_title or len(product_title) < 3:
+            return _title_not_usable(code_or_name, web_results[0])
+
+        if _speculative_hit(raw_task, product_title):
+            return _enrich(web_results[0], raw_task.result())
+
+        title_task = asyncio.ensure_future(afetch_shopping_results(product_title))
+        try:
+            done, _ = await asyncio.wait({raw_task, title_task}, return_when=asyncio.FIRST_COMPLETED)
+            if raw_task in done and _speculative_hit(raw_task, product_title):
+                return _enrich(web_results[0], raw_task.result())
+            return _enrich(web_results[0], await title_task)
+        finally:
+            title_task.cancel()
+    finally:
+        raw_task.cancel()
+
+
+async def afetch_product_combined(code_or_name: str) -> List[Dict]:
+    """Async version of `fetch_product_combined`."""
+    if COMBINED_SPECULATIVE:
+        return await _afetch_product_speculative(code_or_name)
+
+    web_results = await afetch_web_ean_asin(code_or_name)
+
+    if "error" in web_results[0]:
+        return web_results
+
+    product_title = web_results[0].get("Product Title", "")
+    if not product_title or len(product_title) < 3:
+        return _title_not_usable(code_or_name, web_results[0])
+
+    return _enrich(web_results[0], await afetch_shopping_results(product_title))
+
+
+search_product_combined = StructuredTool.from_function(
+    func=fetch_product_combined,
+    coroutine=afetch_product_combined,
+    name="search_product_combined",
+    description="Combine web and shopping search to return enriched product information.",
+)
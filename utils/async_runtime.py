@@ -0,0 +1,62 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Threads for the remaining blocking calls (sync tools, file I/O), shared by every session
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "16"))
+
+_lock = threading.RLock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking")
+    return _executor
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """
+    The process-wide event loop, running forever on a daemon thread.
+
+    Every Streamlit session submits its coroutines here, so async clients
+    (OpenAI, httpx) are created once and their connections reused. The loop's
+    default executor is the bounded shared pool, so `asyncio.to_thread` and
+    `run_in_executor(None, ...)` never grow past BLOCKING_POOL_SIZE threads.
+    """
+    global _loop
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                loop.set_default_executor(get_executor())
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                threading.Thread(target=run, name="event-loop", daemon=True).start()
+                ready.wait()
+                _loop = loop
+    return _loop
+
+
+def submit(coro: Awaitable[T]) -> "Future[T]":
+    """Schedule `coro` on the shared loop from any thread."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run_async(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """Run `coro` on the shared loop and block the calling (script) thread for its result."""
+    return submit(coro).result(timeout)
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import queue
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from utils.async_runtime import submit
+
+# Unique queries in flight at once for one batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+ProgressCallback = Callable[[int, int, int], None]  # (unique done, unique total, duplicate rows saved)
+ResultCallback = Callable[[str, Any], None]  # (unique query, result), e.g. to checkpoint it
+
+
+def dedupe_key(query: str) -> str:
+    return " ".join(query.split()).casefold()
+
+
+def dedupe_queries(queries: Sequence[Optional[str]]) -> Tuple[List[str], List[Optional[int]]]:
+    """
+    Collapse repeated queries. Returns the unique queries (first spelling
+    wins) and, per input row, the position of its unique query (None for
+    rows without a query).
+    """
+    unique: List[str] = []
+    positions: Dict[str, int] = {}
+    row_to_unique: List[Optional[int]] = []
+    for query in queries:
+        if not query:
+            row_to_unique.append(None)
+            continue
+        key = dedupe_key(query)
+        if key not in positions:
+            positions[key] = len(unique)
+            unique.append(query)
+        row_to_unique.append(positions[key])
+    return unique, row_to_unique
+
+
+async def arun_deduplicated(
+    queries: Sequence[Optional[str]],
+    run: Callable[[str], Awaitable[Any]],
+    concurrency: int = BATCH_CONCURRENCY,
+    on_progress: Optional[ProgressCallback] = None,
+    on_result: Optional[ResultCallback] = None,
+) -> List[Any]:
+    """
+    Await `run(query)` once per unique query, at most `concurrency` at a time,
+    and return one result per input row in input order (None for rows
+    without a query). A failing query yields the exception object for each
+    of its rows instead of aborting the batch.
+    """
+    unique, row_to_unique = dedupe_queries(queries)
+    saved = sum(1 for position in row_to_unique if position is not None) - len(unique)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results: List[Any] = [None] * len(unique)
+    done = 0
+
+    async def worker(position: int):
+        nonlocal done
+        async with semaphore:
+            try:
+                results[position] = await run(unique[position])
+            except Exception as e:
+                print(f"[batch_runner] {unique[position]!r} failed: {e}")
+                results[position] = e
+        if on_result:
+            on_result(unique[position], results[position])
+        done += 1
+        if on_progress:
+            on_progress(done, len(unique), saved)
+
+    await asyncio.gather(*(worker(position) for position in range(len(unique))))
+    return [results[position] if position is not None else None for position in row_to_unique]
+
+
+def run_deduplicated(
+    queries: Sequence[Optional[str]],
+    run: Callable[[str], Awaitable[Any]],
+    concurrency: int = BATCH_CONCURRENCY,
+    on_progress: Optional[ProgressCallback] = None,
+    on_result: Optional[ResultCallback] = None,
+) -> List[Any]:
+    """
+    Blocking version of `arun_deduplicated` for the Streamlit script thread:
+    the work runs on the shared event loop and `on_progress` / `on_result`
+    are called from the calling thread, which keeps them safe for Streamlit
+    widgets.
+    """
+    updates: "queue.Queue[Tuple[str, tuple]]" = queue.Queue()
+    future = submit(arun_deduplicated(
+        queries,
+        run,
+        concurrency,
+        lambda *update: updates.put(("progress", update)),
+        lambda *update: updates.put(("result", update)),
+    ))
+
+    while True:
+        try:
+            kind, update = updates.get(timeout=0.1)
+        except queue.Empty:
+            if future.done() and updates.empty():
+                break
+            continue
+        callback = on_progress if kind == "progress" else on_result
+        if callback:
+            callback(*update)
+    return future.result()
@@ -0,0 +1,119 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+# Default in-flight limits for the two pipeline stages (overridable from .env)
+SEARCH_CONCURRENCY = int(os.getenv("SERPER_CONCURRENCY", "16"))
+FILTER_CONCURRENCY = int(os.getenv("GROQ_CONCURRENCY", "4"))
+# Rows handed to one batched filter call (0/1 disables batching)
+FILTER_BATCH_SIZE = int(os.getenv("FILTER_BATCH_SIZE", "8"))
+
+
+def run_fetch_filter_pipeline(
+    items: Sequence[Any],
+    fetch: Callable[[Any], Any],
+    filter_: Optional[Callable[[Any, Any], Any]] = None,
+    search_concurrency: int = SEARCH_CONCURRENCY,
+    filter_concurrency: int = FILTER_CONCURRENCY,
+    on_progress: Optional[Callable[[int, int, Any], None]] = None,
+    filter_batch: Optional[Callable[[List[Any], List[Any]], List[Any]]] = None,
+    batch_size: int = FILTER_BATCH_SIZE,
+    on_result: Optional[Callable[[int, Tuple[Any, Any]], None]] = None,
+) -> List[Tuple[Any, Any]]:
+    """
+    Run `fetch(item)` and then `filter_(item, fetched)` for every item.
+
+    Both stages run in their own bounded thread pool, so a row's filter call
+    starts as soon as its search finishes while other searches are still in
+    flight. Results are returned as `(fetched, filtered)` tuples in input order.
+    `on_progress(done, total, item)` is called from the calling thread, which
+    keeps it safe for Streamlit widgets.
+
+    When `filter_batch(items, fetched_list)` is given, finished searches are
+    buffered and filtered `batch_size` rows at a time instead; a partial batch
+    is flushed once no searches are left in flight.
+
+    `on_result(index, (fetched, filtered))` is called from the calling thread
+    as each row finishes, e.g. to checkpoint it.
+    """
+    total = len(items)
+    if total == 0:
+        return []
+
+    results: List[Optional[Tuple[Any, Any]]] = [None] * total
+    batching = filter_batch is not None and batch_size > 1
+
+    with ThreadPoolExecutor(max_workers=max(1, filter_concurrency), thread_name_prefix="filter") as filter_pool, \
+            ThreadPoolExecutor(max_workers=max(1, search_concurrency), thread_name_prefix="search") as search_pool:
+
+        lock = threading.Lock()
+        buffer = []  # (index, item, fetched, out) waiting for a batched filter call
+        state = {"searching": total}
+
+        def run_batch(batch):
+            try:
+                filtered_list = filter_batch([b[1] for b in batch], [b[2] for b in batch])
+            except BaseException as e:
+                for _, _, _, out in batch:
+                    out.set_exception(e)
+                return
+            for (index, _, fetched, out), filtered in zip(batch, filtered_list):
+                results[index] = (fetched, filtered)
+                out.set_result(index)
+
+        def chain(index: int, item: Any, fetched_future: Future, out: Future):
+            try:
+                fetched = fetched_future.result()
+            except BaseException as e:
+                out.set_exception(e)
+                fetched = None
+
+            if batching:
+                with lock:
+                    state["searching"] -= 1
+                    if not out.done():
+                        buffer.append((index, item, fetched, out))
+                    ready = []
+                    if len(buffer) >= batch_size or (state["searching"] == 0 and buffer):
+                        ready, buffer[:] = buffer[:], []
+                if ready:
+                    filter_pool.submit(run_batch, ready)
+                return
+
+            if out.done():
+                return
+            try:
+                filtered_future = filter_pool.submit(filter_, item, fetched)
+            except BaseException as e:
+                out.set_exception(e)
+                return
+
+            def finish(f: Future):
+                try:
+                    results[index] = (fetched, f.result())
+                    out.set_result(index)
+                except BaseException as e:
+                    out.set_exception(e)
+
+            filtered_future.add_done_callback(finish)
+
+        pending = {}
+        for index, item in enumerate(items):
+            out: Future = Future()
+            pending[out] = item
+            fetched_future = search_pool.submit(fetch, item)
+            fetched_future.add_done_callback(
+                lambda f, index=index, item=item, out=out: chain(index, item, f, out)
+            )
+
+        done = 0
+        for out in as_completed(pending):
+            index = out.result()  # re-raise the first failure, as a sequential run would
+            done += 1
+            if on_result:
+                on_result(index, results[index])
+            if on_progress:
+                on_progress(done, total, pending[out])
+
+    return results
@@ -0,0 +1,310 @@
+"""
+Background job runner.
+
+The Streamlit apps only submit jobs (`submit_job`) and poll `job_panel_rows`;
+the work runs in separate worker processes (`python -m utils.job_runner`)
+that claim jobs from the SQLite queue in utils/job_store.py. Every finished
+row is checkpointed (failed rows too, marked for retry), so a job whose
+worker dies is requeued and resumes.
+Workers register in the job store and heartbeat, so every app process
+counts the same pool, and exit once the queue has been idle for a while.
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from dotenv import load_dotenv
+from utils.job_store import CACHE_DIR, Job, get_job_store
+from utils.lazy_loader import lazy_import
+
+# Worker processes kept alive by the UI; each runs one job at a time
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+# Workers heartbeat every JOB_WORKER_HEARTBEAT seconds and count as dead after JOB_WORKER_TIMEOUT
+JOB_WORKER_HEARTBEAT = float(os.getenv("JOB_WORKER_HEARTBEAT", "5"))
+JOB_WORKER_TIMEOUT = float(os.getenv("JOB_WORKER_TIMEOUT", "30"))
+# An idle worker exits after this long; the next submit starts a new one
+JOB_WORKER_IDLE_EXIT = float(os.getenv("JOB_WORKER_IDLE_EXIT", "300"))
+JOB_WORKER_LOG = os.getenv("JOB_WORKER_LOG", os.path.join(CACHE_DIR, "job_worker.log"))
+
+# Progress callback handed to job handlers:
+# report(done_rows, error_rows, last_error=None, stats=None, resumed=None), where `resumed`
+# is the rows restored from checkpoints and `stats` the job's own counters for the panel
+Report = Callable[..., None]
+
+
+# --- job types ---
+
+def run_bulk_fetch_filter(job: Job, rows: List[Dict[str, Any]], params: Dict[str, Any], report: Report):
+    """main.py bulk tab: Serper search + link filter per (Product Title, Model Number, Country Code) row."""
+    bulk_pipeline = lazy_import("utils.bulk_pipeline")
+    product_search = lazy_import("utils.product_search")
+    link_filter = lazy_import("utils.link_filter")
+
+    saved = job.completed()
+    todo = [position for position in range(len(rows)) if position not in saved]
+    done = len(saved)
+    errors = 0
+    # A worker runs one job at a time, so the process-wide counters' growth is this job's
+    stats_before = link_filter.link_filter_stats()
+
+    def run_stats():
+        stats_now = link_filter.link_filter_stats()
+        return {key: stats_now[key] - stats_before[key] for key in stats_now}
+
+    report(done, errors, stats=run_stats(), resumed=done)
+
+    def on_result(index, result):
+        nonlocal done, errors
+        done += 1
+        failed = next((r["Error"] for r in result[0] if "Error" in r), None)
+        # Search failures (incl. an open breaker) keep their Error row in the output, and the next run retries them
+        job.save(todo[index], result, failed=bool(failed))
+        if failed:
+            errors += 1
+            report(done, errors, f"{rows[todo[index]]['Model Number']}: {failed}", stats=run_stats())
+            return
+        report(done, errors, stats=run_stats())
+
+    bulk_pipeline.run_fetch_filter_pipeline(
+        [rows[position] for position in todo],
+        product_search.fetch_bulk_row,
+        product_search.filter_bulk_row,
+        search_concurrency=params.get("search_concurrency", bulk_pipeline.SEARCH_CONCURRENCY),
+        filter_concurrency=params.get("filter_concurrency", bulk_pipeline.FILTER_CONCURRENCY),
+        filter_batch=product_search.filter_bulk_rows_batch if params.get("batch_filter", True) else None,
+        on_result=on_result,
+    )
+
+
+def run_batch_lookup(job: Job, queries: List[Optional[str]], params: Dict[str, Any], report: Report):
+    """app.py batch lookup: one router query per row, duplicates looked up once."""
+    batch_runner = lazy_import("utils.batch_runner")
+    registry = lazy_import("agents.registry")
+
+    saved = job.completed()
+    remaining = [q if position not in saved else None for position, q in enumerate(queries)]
+    positions_by_key: Dict[str, List[int]] = {}
+    for position, q in enumerate(remaining):
+        if q is not None:
+            positions_by_key.setdefault(batch_runner.dedupe_key(q), []).append(position)
+    done = len(queries) - sum(len(positions) for positions in positions_by_key.values())
+    errors = 0
+    # Unique lookups done vs. duplicate rows answered by them, shown separately in the panel
+    stats = {
+        "unique_done": 0,
+        "unique_total": len(positions_by_key),
+        "duplicates_saved": sum(len(positions) - 1 for positions in positions_by_key.values()),
+    }
+    report(done, errors, stats=stats, resumed=done)
+
+    def on_result(query, response):
+        nonlocal done, errors
+        positions = positions_by_key[batch_runner.dedupe_key(query)]
+        done += len(positions)
+        if isinstance(response, Exception):
+            errors += len(positions)  # shown as failed, retried on the next run
+            job.save_many(positions, {"error": f"{type(response).__name__}: {response}"}, failed=True)
+            report(done, errors, f"{query}: {response}", stats=stats)
+            return
+        job.save_many(positions, response)
+        report(done, errors, stats=stats)
+
+    def on_progress(unique_done, unique_total, duplicates_saved):
+        stats.update(unique_done=unique_done, unique_total=unique_total, duplicates_saved=duplicates_saved)
+        report(done, errors, stats=stats)
+
+    # No conversation memory: rows run concurrently and must not see each other's turns
+    master_agent = registry.create_master_agent(memory=False)
+    batch_runner.run_deduplicated(
+        remaining,
+        master_agent.run,
+        concurrency=params.get("concurrency", batch_runner.BATCH_CONCURRENCY),
+        on_progress=on_progress,
+        on_result=on_result,
+    )
+
+
+def run_seo_generation(job: Job, titles: List[str], params: Dict[str, Any], report: Report):
+    """app.py bulk SEO: one SEO query per product title."""
+    async_runtime = lazy_import("utils.async_runtime")
+    product_utils = lazy_import("utils.product_utils")
+    registry = lazy_import("agents.registry")
+
+    saved = job.completed()
+    report(len(saved), 0, resumed=len(saved))
+    # Each title is a separate one-shot query; history would only leak between products
+    master_agent = registry.create_master_agent(memory=False)
+    errors = 0
+    for position, product_name in enumerate(titles):
+        if position in saved:
+            continue
+        try:
+            response = async_runtime.run_async(master_agent.run(product_utils.seo_query(product_name)))
+            error = None
+        except Exception as e:
+            response, error = None, str(e)
+        seo_entry = product_utils.seo_entry_from_response(product_name, response)
+        if error is None and not any(seo_entry[field] for field in product_utils.SEO_FIELDS):
+            error = "no SEO fields in the response"
+        # A failed product stays in the output as a blank row and is retried by the next run
+        job.save(position, seo_entry, failed=error is not None)
+        if error is not None:
+            errors += 1
+            report(position + 1, errors, f"{product_name}: {error}")
+            continue
+        report(position + 1, errors)
+
+
+JOB_TYPES: Dict[str, Callable[[Job, List[Any], Dict[str, Any], Report], None]] = {
+    "bulk_fetch_filter": run_bulk_fetch_filter,
+    "batch_lookup": run_batch_lookup,
+    "seo_generation": run_seo_generation,
+}
+
+
+# --- submitting and polling (UI side) ---
+
+_spawned: List[subprocess.Popen] = []
+
+
+def ensure_workers(count: int = JOB_WORKERS):
+    """Start workers until `count` are alive, counting every app's workers via their heartbeats."""
+    # Reap workers of ours that exited (idle timeout), so they don't linger as zombies
+    _spawned[:] = [process for process in _spawned if process.poll() is None]
+    store = get_job_store()
+    missing = count - len(store.live_workers(JOB_WORKER_TIMEOUT))
+    if missing <= 0:
+        return
+    os.makedirs(os.path.dirname(JOB_WORKER_LOG) or ".", exist_ok=True)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(JOB_WORKER_LOG, "a") as log:
+        for _ in range(missing):
+            # Own session, so the workers outlive a Streamlit rerun or disconnect
+            process = subprocess.Popen(
+                [sys.executable, "-m", "utils.job_runner"],
+                cwd=root,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+            # Registered right away so a concurrent check in another app doesn't spawn again
+            store.register_worker(process.pid)
+            _spawned.append(process)
+
+
+def submit_job(kind: str, rows: Sequence[Any], params: Optional[Dict[str, Any]] = None) -> str:
+    if kind not in JOB_TYPES:
+        raise ValueError(f"Unknown job type: {kind}")
+    job_id = get_job_store().enqueue(kind, rows, params or {})
+    ensure_workers()
+    return job_id
+
+
+def job_panel_rows(job_ids: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """Queue entries plus rows/s and ETA (seconds) for the jobs panel."""
+    now = time.time()
+    panel = []
+    for entry in get_job_store().queued_jobs(job_ids):
+        rate, eta = None, None
+        # Rows restored from checkpoints took no time in this run
+        processed = entry["done"] - entry["resumed"]
+        if entry["started_at"] and processed > 0:
+            elapsed = (entry["finished_at"] or now) - entry["started_at"]
+            rate = processed / elapsed if elapsed > 0 else None
+            if rate and entry["status"] == "running":
+                eta = (entry["total"] - entry["done"]) / rate
+        panel.append({**entry, "rows_per_s": rate, "eta_s": eta})
+    return panel
+
+
+def job_results(job_id: str) -> Dict[int, Any]:
+    """{position: checkpointed result} of a submitted job, failed rows included."""
+    loaded = get_job_store().load_job(job_id)
+    return loaded[0].results() if loaded else {}
+
+
+# --- worker side ---
+
+def run_job(claimed: Dict[str, Any]):
+    store = get_job_store()
+    job_id = claimed["job_id"]
+    job, _ = store.load_job(job_id)
+    last_write = [0.0]
+    unwritten: Dict[str, Any] = {}
+
+    def report(
+        done: int,
+        errors: int,
+        last_error: Optional[str] = None,
+        stats: Optional[Dict[str, Any]] = None,
+        resumed: Optional[int] = None,
+    ):
+        unwritten.update(done=done, errors=errors)
+        if last_error:
+            unwritten["last_error"] = last_error[:500]
+        if stats is not None:
+            unwritten["stats"] = dict(stats)
+        if resumed is not None:
+            unwritten["resumed"] = resumed
+        # Throttled: the UI polls about once a second
+        now = time.time()
+        if now - last_write[0] < 0.5 and done < job.total:
+            return
+        last_write[0] = now
+        store.update_queued(job_id, **unwritten)
+        unwritten.clear()
+
+    try:
+        JOB_TYPES[claimed["kind"]](job, claimed["rows"], claimed["params"], report)
+        store.update_queued(job_id, **unwritten)  # whatever the throttle held back
+    except Exception as e:
+        traceback.print_exc()
+        store.update_queued(job_id, status="failed", last_error=f"{type(e).__name__}: {e}"[:500], finished_at=time.time())
+        return
+    store.update_queued(job_id, status="done", finished_at=time.time())
+
+
+def _heartbeat(pid: int, stop: threading.Event):
+    store = get_job_store()
+    while not stop.wait(JOB_WORKER_HEARTBEAT):
+        store.heartbeat(pid)
+
+
+def run_worker(poll_interval: float = JOB_POLL_INTERVAL, idle_exit: float = JOB_WORKER_IDLE_EXIT):
+    """Claim and run jobs until the queue has been empty for `idle_exit` seconds."""
+    store = get_job_store()
+    pid = os.getpid()
+    store.register_worker(pid)
+    stop = threading.Event()
+    # From a thread, so a long job still counts as alive
+    threading.Thread(target=_heartbeat, args=(pid, stop), name="heartbeat", daemon=True).start()
+    print(f"[job_runner] worker {pid} started")
+    idle_since = time.time()
+    try:
+        while True:
+            # Jobs left "running" by a worker that stopped heartbeating are picked up again
+            live = set(store.live_workers(JOB_WORKER_TIMEOUT))
+            store.requeue_running([p for p in store.running_worker_pids() if p not in live])
+            claimed = store.claim_next(pid)
+            if claimed is None:
+                if time.time() - idle_since > idle_exit:
+                    print(f"[job_runner] worker {pid} idle for {idle_exit:.0f}s, exiting")
+                    return
+                time.sleep(poll_interval)
+                continue
+            print(f"[job_runner] worker {pid} running {claimed['kind']} job {claimed['job_id'][:12]} ({len(claimed['rows'])} rows)")
+            run_job(claimed)
+            idle_since = time.time()
+    finally:
+        stop.set()
+        store.unregister_worker(pid)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    run_worker()
@@ -0,0 +1,304 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from utils.response_cache import CACHE_DIR, make_cache_key
+
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(CACHE_DIR, "jobs.sqlite"))
+# A job older than this starts over instead of resuming (prices and listings move)
+JOB_MAX_AGE = float(os.getenv("JOB_MAX_AGE", str(24 * 3600)))
+
+
+def row_fingerprint(row: Any) -> str:
+    return make_cache_key("row", row)
+
+
+def _pack(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def _unpack(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob))
+
+
+class Job:
+    """
+    One bulk run. Rows are identified by their fingerprint, so identical rows
+    share a checkpoint and a rerun of the same input resumes where it stopped.
+    """
+
+    def __init__(self, store: "JobStore", job_id: str, kind: str, row_keys: List[str]):
+        self.store = store
+        self.job_id = job_id
+        self.kind = kind
+        self.row_keys = row_keys
+        self.total = len(row_keys)
+
+    def completed(self) -> Dict[int, Any]:
+        """{position: saved result} for every row that finished successfully; a resumed run skips these."""
+        saved = self.store._load_rows(self.job_id)
+        return {position: saved[key] for position, key in enumerate(self.row_keys) if key in saved}
+
+    def results(self) -> Dict[int, Any]:
+        """{position: saved result} including rows saved as failed, for showing the job's output."""
+        saved = self.store._load_rows(self.job_id, include_failed=True)
+        return {position: saved[key] for position, key in enumerate(self.row_keys) if key in saved}
+
+    def save(self, position: int, result: Any, failed: bool = False):
+        self.save_many([position], result, failed)
+
+    def save_many(self, positions: Sequence[int], result: Any, failed: bool = False):
+        """Checkpoint `result`; a `failed` row is kept for the output but retried by the next run."""
+        self.store._save_rows(self.job_id, {self.row_keys[position] for position in positions}, result, failed)
+
+
+class JobStore:
+    """SQLite checkpoint store for bulk runs (one row per finished input row)."""
+
+    def __init__(self, path: str = JOB_STORE_PATH, max_age: float = JOB_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Shared with the background worker processes, so wait on their write locks
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        # Job status lives in job_queue; older checkpoint files also kept it here
+        if "status" in {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}:
+            self._conn.execute("ALTER TABLE jobs DROP COLUMN status")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS job_rows (
+                job_id TEXT NOT NULL,
+                row_key TEXT NOT NULL,
+                result BLOB NOT NULL,
+                finished_at REAL NOT NULL,
+                failed INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (job_id, row_key)
+            )"""
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(job_rows)")}
+        if "failed" not in columns:  # checkpoint files from before failed rows were kept
+            self._conn.execute("ALTER TABLE job_rows ADD COLUMN failed INTEGER NOT NULL DEFAULT 0")
+        # Jobs handed to the background workers (utils/job_runner.py)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS job_queue (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                errors INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                worker_pid INTEGER,
+                submitted_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                resumed INTEGER NOT NULL DEFAULT 0,
+                stats TEXT
+            )"""
+        )
+        # Queue files from before workers reported restored rows and per-job stats
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(job_queue)")}
+        if "resumed" not in columns:
+            self._conn.execute("ALTER TABLE job_queue ADD COLUMN resumed INTEGER NOT NULL DEFAULT 0")
+        if "stats" not in columns:
+            self._conn.execute("ALTER TABLE job_queue ADD COLUMN stats TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS job_queue_status ON job_queue(status, submitted_at)")
+        # Live worker processes, so every app process sees (and counts) the same workers
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS job_workers (
+                pid INTEGER PRIMARY KEY,
+                started_at REAL NOT NULL,
+                heartbeat_at REAL NOT NULL
+            )"""
+        )
+
+    def open_job(self, kind: str, rows: Sequence[Any], params: Any = None) -> Job:
+        """
+        The job for this exact input (`rows` plus `params`), resumed if it was
+        checkpointed within `max_age`, otherwise started fresh. A job that is
+        queued or running keeps its checkpoints whatever its age.
+        """
+        row_keys = [row_fingerprint(row) for row in rows]
+        job_id = make_cache_key(kind, params, row_keys)
+        now = time.time()
+        with self._lock:
+            existing = self._conn.execute("SELECT created_at FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if existing is None:
+                self._conn.execute(
+                    "INSERT INTO jobs (job_id, kind, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, kind, len(rows), now, now),
+                )
+            elif now - existing[0] > self.max_age and not self._is_active(job_id):
+                self._conn.execute("DELETE FROM job_rows WHERE job_id = ?", (job_id,))
+                self._conn.execute("UPDATE jobs SET created_at = ?, updated_at = ? WHERE job_id = ?", (now, now, job_id))
+        return Job(self, job_id, kind, row_keys)
+
+    def _is_active(self, job_id: str) -> bool:
+        row = self._conn.execute("SELECT status FROM job_queue WHERE job_id = ?", (job_id,)).fetchone()
+        return row is not None and row[0] in ("queued", "running")
+
+    # --- queue for background workers ---
+
+    def enqueue(self, kind: str, rows: Sequence[Any], payload: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Queue a job over `rows` (the checkpointed input) with extra `payload`
+        settings. Submitting an input that is already queued or running
+        returns the existing job instead of a duplicate.
+        """
+        job = self.open_job(kind, rows)
+        now = time.time()
+        with self._lock:
+            if self._is_active(job.job_id):
+                return job.job_id
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_queue (job_id, kind, payload, status, total, submitted_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job.job_id, kind, _pack({"rows": list(rows), "params": payload}), "queued", len(rows), now),
+            )
+        return job.job_id
+
+    def claim_next(self, worker_pid: int) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job to running for `worker_pid`."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT job_id, kind, payload FROM job_queue WHERE status = 'queued' ORDER BY submitted_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE job_queue SET status = 'running', worker_pid = ?, started_at = ?, done = 0, errors = 0, last_error = NULL, finished_at = NULL, resumed = 0, stats = NULL WHERE job_id = ?",
+                        (worker_pid, time.time(), row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job_id, kind, payload = row
+        payload = _unpack(payload)
+        return {"job_id": job_id, "kind": kind, "rows": payload["rows"], "params": payload["params"] or {}}
+
+    def update_queued(self, job_id: str, **fields: Any):
+        """Set progress/status columns (done, errors, resumed, last_error, status, finished_at, stats) of a queued job."""
+        if not fields:
+            return
+        if "stats" in fields:
+            fields["stats"] = json.dumps(fields["stats"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE job_queue SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def requeue_running(self, worker_pids: Sequence[int]):
+        """Put jobs held by the given (dead) workers back in the queue; their checkpoints make them resume."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE job_queue SET status = 'queued', worker_pid = NULL WHERE status = 'running' AND worker_pid = ?",
+                [(pid,) for pid in worker_pids],
+            )
+
+    def running_worker_pids(self) -> List[int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT worker_pid FROM job_queue WHERE status = 'running' AND worker_pid IS NOT NULL"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def register_worker(self, pid: int):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO job_workers VALUES (?, ?, ?)", (pid, now, now))
+
+    def heartbeat(self, pid: int):
+        with self._lock:
+            self._conn.execute("UPDATE job_workers SET heartbeat_at = ? WHERE pid = ?", (time.time(), pid))
+
+    def unregister_worker(self, pid: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM job_workers WHERE pid = ?", (pid,))
+
+    def live_workers(self, timeout: float) -> List[int]:
+        """Pids whose last heartbeat is within `timeout` seconds; older entries are dropped."""
+        with self._lock:
+            self._conn.execute("DELETE FROM job_workers WHERE heartbeat_at < ?", (time.time() - timeout,))
+            rows = self._conn.execute("SELECT pid FROM job_workers").fetchall()
+        return [row[0] for row in rows]
+
+    def queued_jobs(self, job_ids: Optional[Sequence[str]] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Queue rows (newest first), optionally only `job_ids`."""
+        query = (
+            "SELECT job_id, kind, status, total, done, errors, last_error, worker_pid, submitted_at, started_at, finished_at, resumed, stats "
+            "FROM job_queue"
+        )
+        args: List[Any] = []
+        if job_ids is not None:
+            if not job_ids:
+                return []
+            query += f" WHERE job_id IN ({', '.join('?' for _ in job_ids)})"
+            args.extend(job_ids)
+        query += " ORDER BY submitted_at DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, args).fetchall()
+        keys = ["job_id", "kind", "status", "total", "done", "errors", "last_error", "worker_pid", "submitted_at", "started_at", "finished_at", "resumed", "stats"]
+        entries = [dict(zip(keys, row)) for row in rows]
+        for entry in entries:
+            entry["stats"] = json.loads(entry["stats"]) if entry["stats"] else {}
+        return entries
+
+    def load_job(self, job_id: str) -> Optional[Tuple[Job, Dict[str, Any]]]:
+        """A queued job's checkpoint handle plus its `{"rows", "params"}` payload."""
+        with self._lock:
+            row = self._conn.execute("SELECT kind, payload FROM job_queue WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        payload = _unpack(row[1])
+        return Job(self, job_id, row[0], [row_fingerprint(r) for r in payload["rows"]]), payload
+
+    def _load_rows(self, job_id: str, include_failed: bool = False) -> Dict[str, Any]:
+        query = "SELECT row_key, result FROM job_rows WHERE job_id = ?"
+        if not include_failed:
+            query += " AND failed = 0"
+        with self._lock:
+            rows = self._conn.execute(query, (job_id,)).fetchall()
+        return {key: _unpack(blob) for key, blob in rows}
+
+    def _save_rows(self, job_id: str, row_keys, result: Any, failed: bool = False):
+        blob = _pack(result)
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO job_rows (job_id, row_key, result, finished_at, failed) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, key, blob, now, int(failed)) for key in row_keys],
+            )
+            self._conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (now, job_id))
+
+
+_job_store: Optional[JobStore] = None
+_job_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    global _job_store
+    if _job_store is None:
+        with _job_store_lock:
+            if _job_store is None:
+                _job_store = JobStore()
+    return _job_store
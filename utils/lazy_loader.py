@@ -0,0 +1,64 @@
+import importlib
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Dict, Iterable, List, Tuple
+
+_lock = threading.Lock()
+_import_ms: Dict[str, float] = {}
+_warmed = set()
+# Modules whose import through lazy_import has completed
+_loaded = set()
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Import `name` on first use and record how long the first import took.
+    Always goes through importlib, which waits for an import still running
+    on another thread (e.g. the warm-up) instead of returning a half
+    initialised module from sys.modules.
+    """
+    if name in _loaded:
+        return sys.modules[name]
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = (time.perf_counter() - started) * 1000
+    with _lock:
+        _import_ms.setdefault(name, elapsed)
+        _loaded.add(name)
+    return module
+
+
+def is_loaded(name: str) -> bool:
+    """True once `name` has finished importing (a module still executing does not count)."""
+    if name in _loaded:
+        return True
+    module = sys.modules.get(name)
+    spec = getattr(module, "__spec__", None)
+    return module is not None and not getattr(spec, "_initializing", False)
+
+
+def warm_up_in_background(modules: Iterable[str]):
+    """Import `modules` on a daemon thread, once per process, so the first real use is fast."""
+    modules = [m for m in modules if m not in _warmed]
+    if not modules:
+        return
+    with _lock:
+        modules = [m for m in modules if m not in _warmed]
+        _warmed.update(modules)
+
+    def run():
+        for name in modules:
+            try:
+                lazy_import(name)
+            except Exception as e:
+                print(f"[lazy_loader] warm-up import of {name} failed: {e}")
+
+    threading.Thread(target=run, name="warm-up", daemon=True).start()
+
+
+def import_report() -> List[Tuple[str, float]]:
+    """(module, first-import ms) pairs, slowest first. Nested imports are counted by the first importer."""
+    with _lock:
+        return sorted(_import_ms.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,402 @@
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from groq import Groq
+
+from utils.llm_batching import parse_keyed_json, run_batched
+from utils.model_matcher import prematch
+from utils.rate_limiter import get_limiter
+from utils.response_cache import CACHE_DIR, ResponseCache, make_cache_key
+from utils.token_budget import count_tokens, get_model_limits, record_usage, split_to_budget
+
+load_dotenv()
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+
+LINK_FILTER_MODEL = os.getenv("LINK_FILTER_MODEL", "llama3-70b-8192")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm_cache.sqlite"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "128"))
+LINK_FILTER_CACHE_TTL = float(os.getenv("LINK_FILTER_CACHE_TTL", str(30 * 24 * 3600)))
+
+_lock = threading.Lock()
+_groq_client = None
+_llm_cache = None
+_stats = {
+    "llm_calls": 0,
+    "batched_calls": 0,
+    "cache_hits": 0,
+    "prompt_tokens_saved": 0,
+    "completion_tokens_saved": 0,
+    "rows_accepted_locally": 0,
+    "rows_rejected_locally": 0,
+    "rows_sent_to_llm": 0,
+}
+
+
+def get_groq_client() -> Groq:
+    global _groq_client
+    if _groq_client is None:
+        with _lock:
+            if _groq_client is None:
+                _groq_client = Groq(api_key=GROQ_API_KEY)
+    return _groq_client
+
+
+def get_llm_cache() -> ResponseCache:
+    global _llm_cache
+    if _llm_cache is None:
+        with _lock:
+            if _llm_cache is None:
+                _llm_cache = ResponseCache(
+                    LLM_CACHE_PATH,
+                    max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024),
+                    ttls={"link_filter": LINK_FILTER_CACHE_TTL},
+                )
+    return _llm_cache
+
+
+# Per-product prompt-token budget for the candidate list. Lists longer than this
+# are split into several chunks instead of being cut off.
+LINK_FILTER_PROMPT_BUDGET = int(os.getenv("LINK_FILTER_PROMPT_BUDGET", "1800"))
+
+_ID_LIST_RE = re.compile(r"\[[\s\d,]*\]")
+
+
+def _field(item: Dict[str, Any], name: str) -> str:
+    # Single-product tab sends Title/Source/Link, bulk rows send title/source/link
+    value = item.get(name, item.get(name.capitalize(), ""))
+    return " ".join(str(value).split())
+
+
+def _row_key(item: Dict[str, Any]) -> List[str]:
+    return [_field(item, "title").lower(), _field(item, "source").lower(), _field(item, "link")]
+
+
+def result_set_fingerprint(data: List[Dict[str, Any]], identifier: str, model: str = LINK_FILTER_MODEL) -> str:
+    """Content hash of (identifier, normalised title/source/link tuples, model)."""
+    rows = sorted(_row_key(item) for item in data)
+    return make_cache_key("link_filter_ids", model, " ".join(str(identifier).split()).upper(), rows)
+
+
+_PROMPT_HEADER = """Product identifier: "{identifier}"
+Candidates, one per line as id|title|source:
+"""
+
+_PROMPT_FOOTER = """
+Return ONLY a JSON array with the ids of the candidates that clearly match the product identifier, e.g. [0, 3]. Return [] if none match. No explanation."""
+
+
+def _candidate_line(index: int, item: Dict[str, Any]) -> str:
+    title = _field(item, "title").replace("|", "/")
+    source = _field(item, "source").replace("|", "/")
+    return f"{index}|{title}|{source}\n"
+
+
+def parse_id_list(raw: str, size: int) -> List[int]:
+    """Parse the model's `[0, 3, ...]` answer into sorted, in-range, unique ids."""
+    found = _ID_LIST_RE.search(raw)
+    if not found:
+        raise ValueError("no JSON id array in response")
+    ids = json.loads(found.group(0))
+    return sorted({i for i in ids if isinstance(i, int) and 0 <= i < size})
+
+
+def _clean_ids(ids: Any, size: int) -> List[int]:
+    if not isinstance(ids, list):
+        raise ValueError("expected a JSON id array")
+    return sorted({i for i in ids if isinstance(i, int) and 0 <= i < size})
+
+
+@dataclass
+class LinkFilterOutcome:
+    matches: List[Dict[str, Any]] = field(default_factory=list)
+    indices: List[int] = field(default_factory=list)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached: bool = False
+    batched: bool = False
+    raw_response: str = ""
+    error: Optional[str] = None
+    accepted_locally: int = 0
+    rejected_locally: int = 0
+    sent_to_llm: int = 0
+
+
+@dataclass
+class _FilterJob:
+    """One chunk of a product's ambiguous candidates that fits the prompt budget."""
+    identifier: str
+    candidates: List[Dict[str, Any]]
+    offset: int
+    block: str
+    block_tokens: int
+    key: str
+
+
+def _prepare_jobs(data: List[Dict[str, Any]], identifier: str, model: str) -> List[_FilterJob]:
+    overhead = count_tokens(_PROMPT_HEADER.format(identifier=identifier) + _PROMPT_FOOTER, model)
+    costs = {}
+
+    def cost(entry):
+        index, item = entry
+        costs[index] = count_tokens(_candidate_line(index, item), model)
+        return costs[index]
+
+    jobs = []
+    for chunk in split_to_budget(list(enumerate(data)), cost, LINK_FILTER_PROMPT_BUDGET - overhead):
+        candidates = [item for _, item in chunk]
+        block = "".join(_candidate_line(i, item) for i, item in enumerate(candidates))
+        jobs.append(_FilterJob(
+            identifier=identifier,
+            candidates=candidates,
+            offset=chunk[0][0],
+            block=block,
+            block_tokens=sum(costs[index] for index, _ in chunk),
+            key=result_set_fingerprint(candidates, identifier, model),
+        ))
+    return jobs
+
+
+def max_filter_tokens(data: List[Dict[str, Any]], identifier: str, model: str = LINK_FILTER_MODEL) -> int:
+    """Upper bound on the tokens filtering `data` can cost: every chunk's prompt plus a full-length answer."""
+    limits = get_model_limits(model)
+    overhead = count_tokens(_PROMPT_HEADER.format(identifier=identifier) + _PROMPT_FOOTER, model)
+    return sum(overhead + job.block_tokens + limits.max_output for job in _prepare_jobs(data, identifier, model))
+
+
+def _cached_outcome(job: _FilterJob) -> Optional[LinkFilterOutcome]:
+    cached = get_llm_cache().get("link_filter", job.key)
+    if cached is None:
+        return None
+    with _lock:
+        _stats["cache_hits"] += 1
+        _stats["prompt_tokens_saved"] += cached["prompt_tokens"]
+        _stats["completion_tokens_saved"] += cached["completion_tokens"]
+    matched = {tuple(row) for row in cached["matched_rows"]}
+    return LinkFilterOutcome(
+        indices=[i for i, item in enumerate(job.candidates) if tuple(_row_key(item)) in matched],
+        prompt_tokens=cached["prompt_tokens"],
+        completion_tokens=cached["completion_tokens"],
+        cached=True,
+        sent_to_llm=len(job.candidates),
+    )
+
+
+def _store_outcome(job: _FilterJob, outcome: LinkFilterOutcome):
+    # Cache matched rows by content, not by id, so a reordered result set still hits
+    get_llm_cache().set("link_filter", job.key, {
+        "matched_rows": [_row_key(job.candidates[i]) for i in outcome.indices],
+        "prompt_tokens": outcome.prompt_tokens,
+        "completion_tokens": outcome.completion_tokens,
+    })
+
+
+# The answer is a list of candidate ids: a handful of tokens per candidate plus JSON framing
+LINK_FILTER_OUTPUT_TOKENS_PER_CANDIDATE = int(os.getenv("LINK_FILTER_OUTPUT_TOKENS_PER_CANDIDATE", "3"))
+
+
+def expected_filter_output(candidates: int, products: int = 1) -> int:
+    return products * 16 + candidates * LINK_FILTER_OUTPUT_TOKENS_PER_CANDIDATE
+
+
+def _complete(prompt: str, model: str, expected_output: int):
+    limits = get_model_limits(model)
+    estimated = count_tokens(prompt, model)
+    if estimated > limits.prompt_budget:
+        raise ValueError(f"Prompt of {estimated} tokens exceeds the {limits.prompt_budget}-token budget of {model}")
+
+    # Reserve a realistic answer, not max_output; the limiter settles on the reported usage
+    response = get_limiter("groq").call(
+        get_groq_client().chat.completions.create,
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.3,
+        max_tokens=min(limits.max_output, max(64, expected_output * 2)),
+        tokens=estimated + expected_output,
+    )
+    with _lock:
+        _stats["llm_calls"] += 1
+    raw = response.choices[0].message.content.strip()
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or estimated
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    record_usage(model, estimated, prompt_tokens, completion_tokens)
+    return raw, prompt_tokens, completion_tokens
+
+
+def _filter_single(job: _FilterJob, model: str) -> LinkFilterOutcome:
+    """
+    Ask the LLM which of the job's candidates match its identifier.
+
+    Results are memoised on `result_set_fingerprint`, so a repeated
+    (identifier, result set) pair is answered without a network call.
+    Unparseable responses and failed calls come back with `error` set
+    (no matches) and are never cached.
+    """
+    cached = _cached_outcome(job)
+    if cached is not None:
+        return cached
+
+    prompt = _PROMPT_HEADER.format(identifier=job.identifier) + job.block + _PROMPT_FOOTER
+    try:
+        raw, prompt_tokens, completion_tokens = _complete(prompt, model, expected_filter_output(len(job.candidates)))
+    except Exception as e:
+        # One failed chunk must not fail the other products of its batch (or the bulk job)
+        return LinkFilterOutcome(sent_to_llm=len(job.candidates), error=f"LLM filter call failed: {e}")
+    outcome = LinkFilterOutcome(
+        raw_response=raw,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        sent_to_llm=len(job.candidates),
+    )
+    try:
+        outcome.indices = parse_id_list(raw, len(job.candidates))
+    except Exception as e:
+        outcome.error = f"Failed to parse LLM response: {e}"
+        return outcome
+
+    _store_outcome(job, outcome)
+    return outcome
+
+
+def _finish(data, identifier, split, outcome: LinkFilterOutcome) -> LinkFilterOutcome:
+    """Combine the local pre-match decisions with the LLM outcome for the ambiguous rows."""
+    accepted, rejected, ambiguous = split
+    outcome.accepted_locally = len(accepted)
+    outcome.rejected_locally = len(rejected)
+    with _lock:
+        _stats["rows_accepted_locally"] += outcome.accepted_locally
+        _stats["rows_rejected_locally"] += outcome.rejected_locally
+        _stats["rows_sent_to_llm"] += outcome.sent_to_llm
+
+    outcome.indices = sorted(accepted + [ambiguous[i] for i in outcome.indices])
+    outcome.matches = [data[i] for i in outcome.indices]
+    return outcome
+
+
+# --- Multi-product batching ---
+
+# Prompt-token budget for one batched request; capped by the model's context limits
+LINK_FILTER_BATCH_BUDGET = int(os.getenv("LINK_FILTER_BATCH_BUDGET", str(get_model_limits(LINK_FILTER_MODEL).prompt_budget)))
+LINK_FILTER_MAX_BATCH = int(os.getenv("LINK_FILTER_MAX_BATCH", "8"))
+
+_BATCH_HEADER = """For each product below, find the candidates that clearly match that product's identifier.
+Candidates are listed one per line as id|title|source; ids restart at 0 for every product.
+"""
+
+_BATCH_FOOTER = """
+Return ONLY a JSON object mapping every product key to the array of matching candidate ids, e.g. {{"P0": [0, 3], "P1": []}}. Include all keys {keys}. No explanation."""
+
+
+def _filter_batch(jobs: List[_FilterJob], model: str) -> Dict[int, LinkFilterOutcome]:
+    sections = [
+        f'\nProduct P{n} identifier: "{job.identifier}"\n{job.block}' for n, job in enumerate(jobs)
+    ]
+    keys = ", ".join(f"P{n}" for n in range(len(jobs)))
+    prompt = _BATCH_HEADER + "".join(sections) + _BATCH_FOOTER.format(keys=keys)
+    expected_output = expected_filter_output(sum(len(job.candidates) for job in jobs), len(jobs))
+    raw, prompt_tokens, completion_tokens = _complete(prompt, model, expected_output)
+    answer = parse_keyed_json(raw)
+
+    # Attribute the request's token usage to each product by its share of the prompt
+    total_block_tokens = sum(job.block_tokens for job in jobs) or 1
+    results = {}
+    for n, job in enumerate(jobs):
+        try:
+            indices = _clean_ids(answer.get(f"P{n}"), len(job.candidates))
+        except ValueError:
+            continue
+        share = job.block_tokens / total_block_tokens
+        outcome = LinkFilterOutcome(
+            indices=indices,
+            prompt_tokens=round(prompt_tokens * share),
+            completion_tokens=round(completion_tokens * share),
+            batched=True,
+            raw_response=raw,
+            sent_to_llm=len(job.candidates),
+        )
+        _store_outcome(job, outcome)
+        results[n] = outcome
+    with _lock:
+        _stats["batched_calls"] += 1
+    return results
+
+
+def _merge_chunks(jobs: List[_FilterJob], outcomes: List[LinkFilterOutcome]) -> LinkFilterOutcome:
+    """Fold the per-chunk outcomes of one product into one, with indices relative to its ambiguous rows."""
+    merged = LinkFilterOutcome(cached=bool(outcomes) and all(o.cached for o in outcomes))
+    for job, outcome in zip(jobs, outcomes):
+        merged.indices.extend(job.offset + i for i in outcome.indices)
+        merged.prompt_tokens += outcome.prompt_tokens
+        merged.completion_tokens += outcome.completion_tokens
+        merged.batched = merged.batched or outcome.batched
+        merged.sent_to_llm += outcome.sent_to_llm
+        merged.error = merged.error or outcome.error
+        if outcome.raw_response:
+            merged.raw_response = "\n".join(filter(None, [merged.raw_response, outcome.raw_response]))
+    return merged
+
+
+def _run_jobs(jobs: List[_FilterJob], model: str) -> List[LinkFilterOutcome]:
+    outcomes: List[Optional[LinkFilterOutcome]] = [_cached_outcome(job) for job in jobs]
+    pending = [n for n, outcome in enumerate(outcomes) if outcome is None]
+
+    if len(pending) == 1:
+        outcomes[pending[0]] = _filter_single(jobs[pending[0]], model)
+    elif pending:
+        batch_overhead = count_tokens(_BATCH_HEADER + _BATCH_FOOTER, model)
+        batch_budget = min(LINK_FILTER_BATCH_BUDGET, get_model_limits(model).prompt_budget)
+        answered = run_batched(
+            [jobs[n] for n in pending],
+            cost=lambda job: job.block_tokens + 20,
+            call_batch=lambda batch: _filter_batch(batch, model),
+            call_single=lambda job: _filter_single(job, model),
+            budget=batch_budget - batch_overhead,
+            max_items=LINK_FILTER_MAX_BATCH,
+        )
+        for n, outcome in zip(pending, answered):
+            outcomes[n] = outcome
+    return outcomes
+
+
+def filter_links_batch(requests: List[Tuple[List[Dict[str, Any]], str]], model: str = LINK_FILTER_MODEL) -> List[LinkFilterOutcome]:
+    """
+    Return, for each `(data, identifier)` pair, the items of `data` that match.
+
+    Rows whose title clearly does or does not contain the model number are
+    decided locally by `utils.model_matcher`. The ambiguous rest is split into
+    chunks that fit `LINK_FILTER_PROMPT_BUDGET`, looked up in the LLM cache,
+    and the misses are packed into as few requests as `LINK_FILTER_BATCH_BUDGET`
+    allows. Chunks missing from a malformed batch answer are retried in
+    smaller batches, ending with single-chunk requests.
+    `indices` point into `data` and are sorted, so callers can pick the
+    matching rows positionally.
+    """
+    splits = [prematch(data, identifier) for data, identifier in requests]
+    owners, jobs = [], []
+    for n, ((data, identifier), split) in enumerate(zip(requests, splits)):
+        for job in _prepare_jobs([data[i] for i in split[2]], identifier, model):
+            owners.append(n)
+            jobs.append(job)
+
+    outcomes = _run_jobs(jobs, model)
+    results = []
+    for n, ((data, identifier), split) in enumerate(zip(requests, splits)):
+        own = [i for i, owner in enumerate(owners) if owner == n]
+        merged = _merge_chunks([jobs[i] for i in own], [outcomes[i] for i in own])
+        results.append(_finish(data, identifier, split, merged))
+    return results
+
+
+def filter_links_by_identifier(data: List[Dict[str, Any]], identifier: str, model: str = LINK_FILTER_MODEL) -> LinkFilterOutcome:
+    """Single-product `filter_links_batch`."""
+    return filter_links_batch([(data, identifier)], model)[0]
+
+
+def link_filter_stats() -> Dict[str, int]:
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,93 @@
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+
+def pack_batches(costs: Sequence[int], budget: int, max_items: int) -> List[List[int]]:
+    """
+    Greedily group item indexes so each batch stays within `budget` tokens and
+    `max_items` items. An item larger than the budget gets a batch of its own.
+    """
+    batches, current, used = [], [], 0
+    for index, cost in enumerate(costs):
+        if current and (used + cost > budget or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append(index)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_keyed_json(raw: str) -> Dict[str, Any]:
+    """Extract the outermost JSON object from an LLM answer."""
+    found = _OBJECT_RE.search(raw or "")
+    if not found:
+        raise ValueError("no JSON object in response")
+    data = json.loads(found.group(0))
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    return data
+
+
+def run_batched(
+    items: Sequence[Any],
+    cost: Callable[[Any], int],
+    call_batch: Callable[[List[Any]], Dict[int, Any]],
+    call_single: Callable[[Any], Any],
+    budget: int,
+    max_items: int,
+    concurrency: int = 1,
+) -> List[Optional[Any]]:
+    """
+    Run `items` through the LLM in as few requests as the token budget allows.
+
+    `call_batch(batch)` returns `{position_in_batch: result}` for the items it
+    could parse; anything missing (or the whole batch, if it raises) is retried
+    at half the batch size, down to `call_single` for one item at a time.
+    A batch that packs a single item goes straight to `call_single`, whose
+    answer is final. With `concurrency > 1` the requests of each round run
+    in a bounded thread pool.
+    """
+    results: List[Optional[Any]] = [None] * len(items)
+    pending = list(range(len(items)))
+    size = max(1, max_items)
+
+    def safe_batch(indexes: List[int]) -> Dict[int, Any]:
+        if len(indexes) == 1:
+            return {0: call_single(items[indexes[0]])}
+        try:
+            return call_batch([items[i] for i in indexes])
+        except Exception as e:
+            print(f"Batched LLM call failed for {len(indexes)} items, retrying smaller: {e}")
+            return {}
+
+    pool = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+    run_all = pool.map if pool else map
+    try:
+        while pending:
+            if size == 1:
+                for index, result in zip(pending, run_all(lambda i: call_single(items[i]), pending)):
+                    results[index] = result
+                break
+
+            batches = [[pending[i] for i in batch] for batch in pack_batches([cost(items[i]) for i in pending], budget, size)]
+            failed = []
+            for indexes, answered in zip(batches, run_all(safe_batch, batches)):
+                for position, index in enumerate(indexes):
+                    if position in answered:
+                        results[index] = answered[position]
+                    else:
+                        failed.append(index)
+
+            pending = failed
+            size = max(1, size // 2)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    return results
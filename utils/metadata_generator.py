@@ -0,0 +1,130 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+from utils.link_filter import get_groq_client
+from utils.llm_batching import parse_keyed_json, run_batched
+from utils.rate_limiter import get_limiter
+from utils.token_budget import count_tokens, get_model_limits, record_usage
+
+METADATA_MODEL = os.getenv("METADATA_MODEL", "llama3-70b-8192")
+METADATA_FIELDS = ["Category", "Description", "Keywords", "MetaTitle"]
+
+# A 5-line description plus the other fields is ~250 output tokens per product;
+# the batch is sized so prompt + expected output fit the model's context.
+METADATA_BATCH_BUDGET = int(os.getenv("METADATA_BATCH_BUDGET", str(get_model_limits(METADATA_MODEL).context - 512)))
+METADATA_OUTPUT_TOKENS_PER_PRODUCT = int(os.getenv("METADATA_OUTPUT_TOKENS_PER_PRODUCT", "300"))
+METADATA_MAX_BATCH = int(os.getenv("METADATA_MAX_BATCH", "10"))
+# Groq requests in flight at once while generating
+METADATA_CONCURRENCY = int(os.getenv("METADATA_CONCURRENCY", "4"))
+
+prompt_template = """
+You are an AI assistant that generates product metadata.
+
+Given product details:
+
+Product Title: {title}
+
+Generate:
+
+1. Category (short phrase)
+2. SEO-friendly Technical Description in 5 lines (in bullet points)
+3. Keywords (comma-separated)
+4. Meta Title (SEO optimized)
+
+Return the answer as JSON with keys: Category, Description, Keywords, MetaTitle.
+"""
+
+batch_prompt_template = """
+You are an AI assistant that generates product metadata.
+
+For EACH product below generate:
+
+1. Category (short phrase)
+2. SEO-friendly Technical Description in 5 lines (in bullet points)
+3. Keywords (comma-separated)
+4. Meta Title (SEO optimized)
+
+Products:
+{products}
+
+Return ONLY a JSON object mapping every product key ({keys}) to an object with keys: Category, Description, Keywords, MetaTitle.
+"""
+
+
+def _complete(prompt: str, expected_output: int) -> str:
+    limits = get_model_limits(METADATA_MODEL)
+    estimated = count_tokens(prompt, METADATA_MODEL)
+    max_tokens = max(256, min(limits.context - estimated, expected_output * 2))
+    # max_tokens leaves headroom; the reservation is the expected answer, settled on the reported usage
+    response = get_limiter("groq").call(
+        get_groq_client().chat.completions.create,
+        model=METADATA_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.3,
+        max_tokens=max_tokens,
+        tokens=estimated + expected_output,
+    )
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or estimated
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    record_usage(METADATA_MODEL, estimated, prompt_tokens, completion_tokens)
+    return response.choices[0].message.content.strip()
+
+
+def _clean(data) -> Dict[str, str]:
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    return {field: data.get(field, "") for field in METADATA_FIELDS}
+
+
+def generate_metadata(title: str) -> Dict[str, str]:
+    """One LLM call for one product title. Raises on unparseable output."""
+    content = _complete(prompt_template.format(title=title), METADATA_OUTPUT_TOKENS_PER_PRODUCT)
+    # Parse JSON from response (some LLMs return text with explanation, so attempt best effort)
+    json_start = content.find("{")
+    json_end = content.rfind("}") + 1
+    return _clean(json.loads(content[json_start:json_end]))
+
+
+def _generate_batch(titles: List[str]) -> Dict[int, Dict[str, str]]:
+    products = "\n".join(f"P{n}: {title}" for n, title in enumerate(titles))
+    keys = ", ".join(f"P{n}" for n in range(len(titles)))
+    prompt = batch_prompt_template.format(products=products, keys=keys)
+    answer = parse_keyed_json(_complete(prompt, METADATA_OUTPUT_TOKENS_PER_PRODUCT * len(titles)))
+
+    results = {}
+    for n in range(len(titles)):
+        try:
+            results[n] = _clean(answer.get(f"P{n}"))
+        except ValueError:
+            continue
+    return results
+
+
+def _generate_single_safe(title: str) -> Optional[Dict[str, str]]:
+    try:
+        return generate_metadata(title)
+    except Exception as e:
+        print(f"AI generation failed for '{title}': {e}")
+        return None
+
+
+def generate_metadata_batch(titles: List[str], concurrency: int = METADATA_CONCURRENCY) -> List[Optional[Dict[str, str]]]:
+    """
+    Generate metadata for many titles with as few LLM calls as possible.
+
+    Titles are packed by measured prompt tokens plus the expected output per
+    product. Products missing from a malformed answer are retried in smaller
+    batches; a product that still fails comes back as None.
+    """
+    overhead = count_tokens(batch_prompt_template, METADATA_MODEL)
+    return run_batched(
+        titles,
+        cost=lambda title: count_tokens(title, METADATA_MODEL) + 5 + METADATA_OUTPUT_TOKENS_PER_PRODUCT,
+        call_batch=_generate_batch,
+        call_single=_generate_single_safe,
+        budget=METADATA_BATCH_BUDGET - overhead,
+        max_items=METADATA_MAX_BATCH,
+        concurrency=concurrency,
+    )
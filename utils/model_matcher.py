@@ -0,0 +1,84 @@
+import os
+import re
+from typing import Any, Dict, List, Tuple
+
+from rapidfuzz import fuzz
+
+# Region / colour / packaging suffixes retailers append to the same model
+KNOWN_SUFFIXES = tuple(
+    s.strip().upper()
+    for s in os.getenv("MODEL_SUFFIXES", "EU,UK,US,INT,BK,BLK,WH,WHT,SL,GR,GY,SV,CN").split(",")
+    if s.strip()
+)
+# Below this fuzzy score the model number is considered absent from the title
+REJECT_SCORE = float(os.getenv("MODEL_MATCH_REJECT_SCORE", "70"))
+# Titles are scanned for windows of up to this many adjacent tokens ("PD 2705 Q")
+MAX_WINDOW = 3
+
+ACCEPT, REJECT, AMBIGUOUS = "accept", "reject", "ambiguous"
+
+_TOKEN_RE = re.compile(r"[A-Z0-9]+")
+
+
+def normalize_model_number(value: str) -> str:
+    """Upper-case and drop dashes, spaces, slashes and other separators."""
+    return "".join(_TOKEN_RE.findall(str(value).upper()))
+
+
+def strip_known_suffix(model: str) -> str:
+    for suffix in KNOWN_SUFFIXES:
+        if model.endswith(suffix) and len(model) - len(suffix) >= 4:
+            return model[: -len(suffix)]
+    return model
+
+
+def _title_windows(title: str) -> List[str]:
+    tokens = _TOKEN_RE.findall(str(title).upper())
+    windows = []
+    for size in range(1, MAX_WINDOW + 1):
+        for start in range(len(tokens) - size + 1):
+            windows.append("".join(tokens[start:start + size]))
+    return windows
+
+
+def classify_title(title: str, identifier: str) -> str:
+    """
+    Decide locally whether `title` refers to model `identifier`.
+
+    ACCEPT when the normalised model (optionally plus a known suffix) appears as
+    whole adjacent tokens in the title, REJECT when nothing in the title comes
+    close to it, AMBIGUOUS otherwise (left for the LLM). An identifier that
+    itself names a variant ("MX518WH") only accepts that exact variant, so
+    colour and region variants never accept each other.
+    """
+    model = normalize_model_number(identifier)
+    if len(model) < 4:
+        return AMBIGUOUS  # too short to tell a model number from ordinary words
+
+    # Suffixes are only stripped from the title side: "MX518" accepts "MX518 WH", not the reverse
+    variant = strip_known_suffix(model) != model
+    windows = _title_windows(title)
+    for window in windows:
+        if window == model or (not variant and strip_known_suffix(window) == model):
+            return ACCEPT
+
+    best = max((fuzz.ratio(model, window) for window in windows), default=0.0)
+    partial = fuzz.partial_ratio(model, "".join(_TOKEN_RE.findall(str(title).upper())))
+    if best < REJECT_SCORE and partial < REJECT_SCORE:
+        return REJECT
+    return AMBIGUOUS
+
+
+def prematch(data: List[Dict[str, Any]], identifier: str) -> Tuple[List[int], List[int], List[int]]:
+    """Split candidate indexes into (accepted, rejected, ambiguous)."""
+    accepted, rejected, ambiguous = [], [], []
+    for index, item in enumerate(data):
+        title = item.get("title", item.get("Title", ""))
+        decision = classify_title(title, identifier)
+        if decision == ACCEPT:
+            accepted.append(index)
+        elif decision == REJECT:
+            rejected.append(index)
+        else:
+            ambiguous.append(index)
+    return accepted, rejected, ambiguous
@@ -0,0 +1,108 @@
+"""
+Serper shopping search and the bulk fetch/filter row stages.
+
+Kept free of Streamlit so the UI, background job workers and the API
+service can all import it. Heavy clients load on first use.
+"""
+from typing import Any, Dict, List
+
+from utils.lazy_loader import lazy_import
+
+
+# --- Serper Shopping API ---
+def search_serper_shopping(query: str, country: str = "us"):
+    payload = {
+        "q": query,
+        "gl": country.lower()
+    }
+    serper_client = lazy_import("utils.serper_client")
+    httpx = lazy_import("httpx")
+    try:
+        data = serper_client.serper_search("shopping", payload)
+    except httpx.HTTPStatusError as e:
+        return {"error": f"Serper API error: {e.response.status_code} - {e.response.text}", "results": []}
+    except httpx.HTTPError as e:
+        return {"error": f"Serper API error: {e}", "results": []}
+    shopping_results = data.get("shopping", [])
+    shopping_results = shopping_results[:41]
+    return {"error": None, "results": shopping_results}
+
+
+def format_results_for_csv(product_title, model_number, results, error=None):
+    rows = []
+    if error:
+        return [{"Product Title": product_title, "Model Number": model_number, "Error": error}]
+    for r in results:
+        rows.append({
+            "Product Title": product_title,
+            "Model Number": model_number,
+            "Title": r.get("title", ""),
+            "Source": r.get("source", ""),
+            "Link": r.get("link", ""),
+            "Price": r.get("price", ""),
+            "Rating": r.get("rating", ""),
+            "RatingCount": r.get("ratingCount", ""),
+            "ImageURL": r.get("imageUrl", "")
+        })
+    return rows
+
+
+# --- Bulk row stages (run from worker threads, so no Streamlit calls) ---
+def fetch_bulk_row(row: dict):
+    query = f"{row['Product Title']} {row['Model Number']}"
+    result = search_serper_shopping(query, row["Country Code"])
+    return format_results_for_csv(row["Product Title"], row["Model Number"], result["results"], result["error"])
+
+
+def _filter_inputs(full_rows: list):
+    result_rows = [r for r in full_rows if "Error" not in r]
+    return result_rows, [{"title": r["Title"], "source": r["Source"], "link": r["Link"]} for r in result_rows]
+
+
+def _apply_matches(full_rows: list, result_rows: list, matched: list):
+    if not matched:
+        return full_rows  # fallback
+    return [result_rows[i] for i in matched]
+
+
+def filter_bulk_row_with_outcome(row: dict, full_rows: list):
+    """`filter_bulk_row` plus the LinkFilterOutcome (None when nothing was sent to the filter)."""
+    result_rows, data_to_filter = _filter_inputs(full_rows)
+    if not data_to_filter:
+        return full_rows, None  # error row or no results: nothing for the LLM to filter
+
+    outcome = lazy_import("utils.link_filter").filter_links_by_identifier(data_to_filter, row["Model Number"])
+    if outcome.error:
+        print(f"{outcome.error} ({row['Model Number']})")
+    return _apply_matches(full_rows, result_rows, outcome.indices), outcome
+
+
+def filter_bulk_row(row: dict, full_rows: list):
+    return filter_bulk_row_with_outcome(row, full_rows)[0]
+
+
+def filter_token_bound(row: dict, full_rows: list) -> int:
+    """Most tokens `filter_bulk_row` can spend on these results (0 when nothing would be sent)."""
+    _, data_to_filter = _filter_inputs(full_rows)
+    if not data_to_filter:
+        return 0
+    return lazy_import("utils.link_filter").max_filter_tokens(data_to_filter, row["Model Number"])
+
+
+def filter_bulk_rows_batch(rows: list, full_rows_list: list):
+    prepared = [_filter_inputs(full_rows) for full_rows in full_rows_list]
+    todo = [n for n, (_, data) in enumerate(prepared) if data]
+    outcomes = lazy_import("utils.link_filter").filter_links_batch([(prepared[n][1], rows[n]["Model Number"]) for n in todo])
+
+    matched = {n: outcome.indices for n, outcome in zip(todo, outcomes)}
+    for n, outcome in zip(todo, outcomes):
+        if outcome.error:
+            print(f"{outcome.error} ({rows[n]['Model Number']})")
+    return [
+        _apply_matches(full_rows, prepared[n][0], matched[n]) if n in matched else full_rows
+        for n, full_rows in enumerate(full_rows_list)
+    ]
+
+
+def has_error(full_rows: List[Dict[str, Any]]) -> bool:
+    return any("Error" in r for r in full_rows)
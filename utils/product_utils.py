@@ -1,7 +1,11 @@
-import pandas as pd
+import csv
+import hashlib
+import importlib.util
 import io
 import json
-from typing import List, Dict, Any
+import os
+from collections.abc import Mapping
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
 
 def extract_all_products(response: Dict[str, Any]) -> List[Dict[str, Any]]:
     products = []
@@ -19,25 +23,196 @@ def extract_all_products(response: Dict[str, Any]) -> List[Dict[str, Any]]:
     return products
 
 
-def save_products_to_files(products: List[Dict]) -> Dict[str, bytes]:
-    df = pd.DataFrame(products)
+def _present(value: Any) -> bool:
+    return value is not None and value == value and str(value).strip() != ""  # value == value drops NaN
 
-    # CSV in memory
-    csv_buffer = io.StringIO()
-    df.to_csv(csv_buffer, index=False)
-    csv_data = csv_buffer.getvalue().encode('utf-8')
 
-    # XLSX in memory
-    xlsx_buffer = io.BytesIO()
-    df.to_excel(xlsx_buffer, index=False, engine='openpyxl')
-    xlsx_data = xlsx_buffer.getvalue()
+def lookup_query(row: Any) -> Optional[str]:
+    """Router query for one batch lookup row (Product Title, else ASIN, else EAN); None if the row has none."""
+    if _present(row.get("Product Title")):
+        return f"Find product info for product title: {row['Product Title']}"
+    for column in ("ASIN", "EAN"):
+        if _present(row.get(column)):
+            return f"Find product info for identifier: {row[column]}"
+    return None
 
-    # JSON in memory
-    json_str = json.dumps(products, ensure_ascii=False, indent=4)
-    json_data = json_str.encode('utf-8')
 
-    return {
-        "csv": csv_data,
-        "xlsx": xlsx_data,
-        "json": json_data
+def seo_query(product_name: str) -> str:
+    return (
+        f"Generate SEO content for the following product:\n"
+        f"{product_name}\n"
+        f"Return JSON with keys: meta_title, description, keywords, category."
+    )
+
+
+SEO_FIELDS = ["Meta Title", "Description", "Keywords", "Category"]
+
+
+def seo_entry_from_response(product_name: str, response: Dict[str, Any]) -> Dict[str, Any]:
+    """One output row of the bulk SEO generator; fields stay empty unless an agent answered with JSON."""
+    # This assumes the SEO agent responds with a JSON string
+    seo_entry = {
+        "Product Title": product_name,
+        "Meta Title": "",
+        "Description": "",
+        "Keywords": "",
+        "Category": "",
     }
+
+    if isinstance(response, dict) and "responses" in response:
+        for item in response["responses"]:
+            if isinstance(item["content"], str):
+                try:
+                    content = json.loads(item["content"])
+                    seo_entry.update({
+                        "Meta Title": content.get("meta_title", ""),
+                        "Description": content.get("description", ""),
+                        "Keywords": content.get("keywords", ""),
+                        "Category": content.get("category", ""),
+                    })
+                except json.JSONDecodeError:
+                    pass
+
+    return seo_entry
+
+
+# Products written per chunk by the streaming exporters
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+
+# format -> (button label, MIME type)
+EXPORT_FORMATS = {
+    "csv": ("CSV", "text/csv"),
+    "xlsx": ("XLSX", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "json": ("JSON", "application/json"),
+    "parquet": ("Parquet", "application/vnd.apache.parquet"),
+}
+
+
+def _export_columns(products: List[Dict[str, Any]]) -> List[str]:
+    """Union of product keys in first-seen order (what pandas.DataFrame(products) would use)."""
+    columns: Dict[str, None] = {}
+    for product in products:
+        columns.update(dict.fromkeys(product))
+    return list(columns)
+
+
+def _cell(value: Any) -> Any:
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _chunks(products: List[Dict[str, Any]], size: int = EXPORT_CHUNK_ROWS):
+    for start in range(0, len(products), size):
+        yield products[start:start + size]
+
+
+def write_csv(products: List[Dict[str, Any]], out: BinaryIO):
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    # Plain "\n" rows, matching pandas' to_csv; the csv module defaults to "\r\n"
+    writer = csv.DictWriter(text, fieldnames=_export_columns(products), lineterminator="\n")
+    writer.writeheader()
+    for chunk in _chunks(products):
+        writer.writerows({k: _cell(v) for k, v in product.items()} for product in chunk)
+    text.detach()
+
+
+def write_xlsx(products: List[Dict[str, Any]], out: BinaryIO):
+    import xlsxwriter
+
+    # constant_memory flushes each finished row to a temp file instead of holding the sheet
+    workbook = xlsxwriter.Workbook(out, {"constant_memory": True, "strings_to_urls": False, "in_memory": False})
+    sheet = workbook.add_worksheet()
+    columns = _export_columns(products)
+    sheet.write_row(0, 0, columns)
+    for row, product in enumerate(products, start=1):
+        sheet.write_row(row, 0, [_cell(product.get(column)) for column in columns])
+    workbook.close()
+
+
+def write_json(products: List[Dict[str, Any]], out: BinaryIO):
+    import orjson
+
+    options = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+    out.write(b"[")
+    separator = b"\n"
+    for chunk in _chunks(products):
+        # One write per chunk keeps the many small dumps off the output stream
+        out.write(separator + b",\n".join(orjson.dumps(product, default=str, option=options) for product in chunk))
+        separator = b",\n"
+    out.write(b"\n]\n")
+
+
+def write_parquet(products: List[Dict[str, Any]], out: BinaryIO):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Scraped values mix numbers and strings ("$19.99", 4.5, "N/A"), so every column is text
+    columns = _export_columns(products)
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    with pq.ParquetWriter(out, schema) as writer:
+        for chunk in _chunks(products):
+            writer.write_batch(pa.record_batch(
+                [
+                    pa.array([None if (v := _cell(p.get(column))) is None else str(v) for p in chunk], pa.string())
+                    for column in columns
+                ],
+                schema=schema,
+            ))
+
+
+EXPORT_WRITERS = {"csv": write_csv, "xlsx": write_xlsx, "json": write_json, "parquet": write_parquet}
+
+
+def available_export_formats() -> List[str]:
+    optional = {"xlsx": "xlsxwriter", "parquet": "pyarrow"}
+    return [fmt for fmt in EXPORT_FORMATS if fmt not in optional or importlib.util.find_spec(optional[fmt])]
+
+
+class ProductExport(Mapping):
+    """
+    `{format: file buffer}` for a list of products, but each format is only
+    written the first time it is looked up, streaming rows in chunks. The
+    buffer is handed out as is (rewound), not copied into bytes.
+    """
+
+    is_lazy = True
+
+    def __init__(self, products: List[Dict[str, Any]]):
+        self.products = products
+        self._files: Dict[str, io.BytesIO] = {}
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies the product list, e.g. to keep generated files across Streamlit reruns."""
+        if self._fingerprint is None:
+            import orjson
+
+            digest = hashlib.blake2b(digest_size=16)
+            for chunk in _chunks(self.products):
+                digest.update(orjson.dumps(chunk, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def __getitem__(self, fmt: str) -> io.BytesIO:
+        if fmt not in self._files:
+            if fmt not in EXPORT_WRITERS:
+                raise KeyError(fmt)
+            buffer = io.BytesIO()
+            EXPORT_WRITERS[fmt](self.products, buffer)
+            self._files[fmt] = buffer
+        buffer = self._files[fmt]
+        buffer.seek(0)
+        return buffer
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(available_export_formats())
+
+    def __len__(self) -> int:
+        return len(available_export_formats())
+
+
+def save_products_to_files(products: List[Dict]) -> ProductExport:
+    """Lazy CSV/XLSX/JSON/Parquet exports of `products`; nothing is written until a format is read."""
+    return ProductExport(products)
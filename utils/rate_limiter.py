@@ -0,0 +1,274 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+# Attempts per call (first try included) and the cap on one backoff sleep
+RATE_LIMIT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "5"))
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "60"))
+
+# (requests/min, tokens/min, max in-flight); 0 disables a limit. Override with e.g. GROQ_RPM / GROQ_TPM / GROQ_MAX_INFLIGHT.
+PROVIDER_DEFAULTS = {
+    "serper": (300, 0, 16),
+    "groq": (30, 6000, 4),
+    "openai": (500, 200000, 8),
+}
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """429 from httpx, Groq or OpenAI (all expose the status on the error or its response)."""
+    return _status_code(error) == 429
+
+
+def usage_tokens(response: Any) -> Optional[int]:
+    """Total tokens an OpenAI-style completion (or a LangChain ChatResult) reports in `usage`, if any."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        llm_output = getattr(response, "llm_output", None) or {}
+        total = (llm_output.get("token_usage") or {}).get("total_tokens")
+        if total is not None:
+            return total
+    total = getattr(usage, "total_tokens", None)
+    if total is None and usage is not None:
+        prompt, completion = getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+        if prompt is not None or completion is not None:
+            total = (prompt or 0) + (completion or 0)
+    return total
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) * scale)
+        except ValueError:
+            continue  # HTTP-date form: fall back to backoff
+    return None
+
+
+class TokenBucket:
+    """
+    Refills at `per_minute / 60` per second up to `per_minute`.
+
+    `reserve` always takes the amount, possibly into debt, and returns how
+    long the caller must wait before using it, so sync and async callers
+    share one bucket and are served in arrival order.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+            self._updated = now
+            self._level -= min(amount, self.capacity)
+            return max(0.0, -self._level / self.rate)
+
+    def refund(self, amount: float):
+        """Give back an over-estimate; a negative amount charges an under-estimate (may go into debt)."""
+        with self._lock:
+            self._level = min(self.capacity, self._level + amount)
+
+
+class ProviderLimiter:
+    """
+    Shared limiter for one provider: request and token buckets, a pause
+    honoring Retry-After, AIMD in-flight limit (+1/limit per success, halved
+    on a 429) and jittered exponential retries of rate-limited calls.
+    """
+
+    def __init__(self, name: str, rpm: float, tpm: float, max_concurrency: int, min_concurrency: int = 1):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self._stats = {"calls": 0, "rate_limited": 0, "retries": 0, "waited_s": 0.0}
+
+    # --- admission ---
+
+    def reserve_delay(self, tokens: int = 0) -> float:
+        delay = max(0.0, self._paused_until - time.monotonic())
+        if self.requests:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens and tokens:
+            delay = max(delay, self.tokens.reserve(tokens))
+        if delay:
+            with self._cond:
+                self._stats["waited_s"] += delay
+        return delay
+
+    def refund_tokens(self, tokens: int):
+        if self.tokens and tokens:
+            self.tokens.refund(tokens)
+
+    def _settle(self, reserved: int, result: Any):
+        """Replace the token estimate with what the provider reports having used."""
+        used = usage_tokens(result)
+        if used is not None:
+            self.refund_tokens(reserved - used)
+
+    def _try_enter(self) -> bool:
+        with self._cond:
+            if self._in_flight < int(self.limit):
+                self._in_flight += 1
+                return True
+            return False
+
+    def _enter(self):
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait(0.1)
+            self._in_flight += 1
+
+    async def _aenter(self):
+        while not self._try_enter():
+            await asyncio.sleep(0.05)
+
+    def _leave(self, succeeded: bool):
+        with self._cond:
+            self._in_flight -= 1
+            self._stats["calls"] += 1
+            if succeeded:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def _on_error(self, error: BaseException):
+        if not is_rate_limited(error):
+            return
+        pause = retry_after_seconds(error) or 1.0
+        with self._cond:
+            self._stats["rate_limited"] += 1
+            self.limit = max(float(self.min_concurrency), self.limit / 2)
+            self._paused_until = max(self._paused_until, time.monotonic() + min(pause, RATE_LIMIT_MAX_WAIT))
+        print(f"[rate_limiter] {self.name} rate limited, pausing {pause:.1f}s, in-flight limit {int(self.limit)}")
+
+    def _count_retry(self, _retry_state):
+        with self._cond:
+            self._stats["retries"] += 1
+
+    def _retry_kwargs(self) -> Dict[str, Any]:
+        return dict(
+            retry=retry_if_exception(is_rate_limited),
+            wait=wait_random_exponential(multiplier=0.5, max=RATE_LIMIT_MAX_WAIT),
+            stop=stop_after_attempt(RATE_LIMIT_RETRIES),
+            before_sleep=self._count_retry,
+            reraise=True,
+        )
+
+    # --- calls ---
+
+    def call(self, fn: Callable[..., Any], *args, tokens: int = 0, **kwargs) -> Any:
+        """
+        Run `fn(*args, **kwargs)` within the limits. `tokens` (prompt plus
+        expected output) is reserved once per call, not per retry, and
+        settled against the `usage` the response reports; a call that
+        finally fails gives it back.
+        """
+        token_delay = self.reserve_delay(tokens) if tokens else 0.0
+        first = True
+        try:
+            for attempt in Retrying(**self._retry_kwargs()):
+                with attempt:
+                    # The first attempt's request slot was reserved along with the tokens
+                    delay = token_delay if first and tokens else self.reserve_delay()
+                    first = False
+                    if delay:
+                        time.sleep(delay)
+                    self._enter()
+                    succeeded = False
+                    try:
+                        result = fn(*args, **kwargs)
+                        succeeded = True
+                    except Exception as e:
+                        self._on_error(e)
+                        raise
+                    finally:
+                        self._leave(succeeded)
+        except BaseException:
+            self.refund_tokens(tokens)
+            raise
+        self._settle(tokens, result)
+        return result
+
+    async def acall(self, fn: Callable[..., Awaitable[Any]], *args, tokens: int = 0, **kwargs) -> Any:
+        """Async version of `call` for coroutine functions."""
+        token_delay = self.reserve_delay(tokens) if tokens else 0.0
+        first = True
+        try:
+            async for attempt in AsyncRetrying(**self._retry_kwargs()):
+                with attempt:
+                    delay = token_delay if first and tokens else self.reserve_delay()
+                    first = False
+                    if delay:
+                        await asyncio.sleep(delay)
+                    await self._aenter()
+                    succeeded = False
+                    try:
+                        result = await fn(*args, **kwargs)
+                        succeeded = True
+                    except Exception as e:
+                        self._on_error(e)
+                        raise
+                    finally:
+                        self._leave(succeeded)
+        except BaseException:
+            self.refund_tokens(tokens)
+            raise
+        self._settle(tokens, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {**self._stats, "in_flight": self._in_flight, "limit": int(self.limit), "max_concurrency": self.max_concurrency}
+
+
+_limiters: Dict[str, ProviderLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider: str) -> ProviderLimiter:
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(provider)
+            if limiter is None:
+                rpm, tpm, inflight = PROVIDER_DEFAULTS.get(provider, (0, 0, 8))
+                prefix = provider.upper()
+                limiter = ProviderLimiter(
+                    provider,
+                    rpm=float(os.getenv(f"{prefix}_RPM", rpm)),
+                    tpm=float(os.getenv(f"{prefix}_TPM", tpm)),
+                    max_concurrency=int(os.getenv(f"{prefix}_MAX_INFLIGHT", inflight)),
+                )
+                _limiters[provider] = limiter
+    return limiter
+
+
+def rate_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
@@ -0,0 +1,290 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+
+# Threads shared by every endpoint for sync hedged calls; when they are all busy calls run unhedged
+HEDGE_POOL_SIZE = int(os.getenv("HEDGE_POOL_SIZE", "8"))
+
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+_hedge_slots = threading.BoundedSemaphore(HEDGE_POOL_SIZE)
+_hedge_pool_lock = threading.Lock()
+
+
+def _submit_hedged(fn: Callable[..., Any], *args) -> Optional[Future]:
+    """Run `fn` on the shared hedge pool, or return None when every thread is taken (never queues)."""
+    global _hedge_pool
+    if not _hedge_slots.acquire(blocking=False):
+        return None
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_POOL_SIZE, thread_name_prefix="hedge")
+
+    def run():
+        try:
+            return fn(*args)
+        finally:
+            _hedge_slots.release()
+
+    return _hedge_pool.submit(run)
+
+
+class CircuitOpenError(httpx.HTTPError):
+    """Raised without a network call while an endpoint's breaker is open."""
+
+
+class HedgeSkipped(Exception):
+    """Raised by a `hedge_send` that found the call already settled before it could send."""
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """Timeouts, connection errors and 5xx count against the breaker; 4xx/429 mean the endpoint is up."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies (seconds)."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures; open ->
+    half_open after `reset_timeout` seconds, where one probe call decides
+    between closed and another open period.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probing = False
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class ResilientEndpoint:
+    """
+    Circuit breaker plus p95 hedging for one endpoint.
+
+    A call that is still running after the endpoint's observed p95 gets one
+    duplicate request, and whichever answers first wins. Hedges are capped at
+    `hedge_max_rate` of calls so a slow endpoint is not hit twice as hard.
+    `send` must raise (e.g. `raise_for_status`) for responses that should not win.
+    `hedge_send(settled)` (default: `send()`) sends the duplicate, e.g. through
+    a rate limiter the caller already passed for the first request. `settled`
+    is a threading.Event set once the call has returned; a hedge still waiting
+    for its turn should check it and raise `HedgeSkipped` instead of sending.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        breaker: CircuitBreaker,
+        latency: LatencyTracker,
+        hedge: bool = True,
+        hedge_quantile: float = 0.95,
+        hedge_max_rate: float = 0.1,
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.latency = latency
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_max_rate = hedge_max_rate
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "failures": 0, "short_circuited": 0, "hedged": 0, "hedge_wins": 0, "stale_served": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None when hedging is off, unwarmed or over budget."""
+        if not self.hedge:
+            return None
+        with self._lock:
+            if self._stats["hedged"] >= self.hedge_max_rate * max(1, self._stats["calls"]):
+                return None
+        return self.latency.percentile(self.hedge_quantile)
+
+    def _admit(self):
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError(f"{self.name} circuit open; failing fast")
+        self._count("calls")
+
+    def _settle(self, error: Optional[BaseException]):
+        if error is not None and is_endpoint_failure(error):
+            self._count("failures")
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _timed(self, send: Callable[[], Any]) -> Any:
+        started = time.monotonic()
+        result = send()
+        self.latency.add(time.monotonic() - started)
+        return result
+
+    def call(self, send: Callable[[], Any], hedge_send: Optional[Callable[[threading.Event], Any]] = None) -> Any:
+        self._admit()
+        try:
+            result = self._call_hedged(send, hedge_send or (lambda settled: send()))
+        except Exception as e:
+            self._settle(e)
+            raise
+        self._settle(None)
+        return result
+
+    def _call_hedged(self, send: Callable[[], Any], hedge_send: Callable[[threading.Event], Any]) -> Any:
+        delay = self.hedge_delay()
+        primary = _submit_hedged(self._timed, send) if delay is not None else None
+        if primary is None:
+            return self._timed(send)  # hedging off, unwarmed, over budget or the pool is busy
+
+        settled = threading.Event()
+        try:
+            hedge = None
+            done, pending = wait({primary}, timeout=delay)
+            if not done:
+                hedge = _submit_hedged(self._timed, lambda: hedge_send(settled))
+                if hedge is not None:
+                    self._count("hedged")
+                    pending.add(hedge)
+
+            error = None
+            while True:
+                for future in done:
+                    if future.exception() is None:
+                        if future is hedge:
+                            self._count("hedge_wins")
+                        return future.result()  # a losing request that already went out finishes in the background
+                    error = error or future.exception()
+                if not pending:
+                    raise error
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        finally:
+            settled.set()
+
+    async def _atimed(self, send: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        result = await send()
+        self.latency.add(time.monotonic() - started)
+        return result
+
+    async def acall(
+        self, send: Callable[[], Awaitable[Any]], hedge_send: Optional[Callable[[threading.Event], Awaitable[Any]]] = None
+    ) -> Any:
+        """Async version of `call`; the losing request is cancelled."""
+        self._admit()
+        try:
+            result = await self._acall_hedged(send, hedge_send or (lambda settled: send()))
+        except Exception as e:
+            self._settle(e)
+            raise
+        self._settle(None)
+        return result
+
+    async def _acall_hedged(self, send: Callable[[], Awaitable[Any]], hedge_send: Callable[[threading.Event], Awaitable[Any]]) -> Any:
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._atimed(send)
+
+        primary = asyncio.ensure_future(self._atimed(send))
+        pending = {primary}
+        settled = threading.Event()
+        # From here on, a cancelled caller must not leave either request running
+        try:
+            hedge = None
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                self._count("hedged")
+                hedge = asyncio.ensure_future(self._atimed(lambda: hedge_send(settled)))
+                pending.add(hedge)
+
+            error = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = error or task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            settled.set()
+            for task in pending:
+                task.cancel()
+
+    def record_stale_served(self):
+        self._count("stale_served")
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.latency.percentile(self.hedge_quantile)
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(
+            state=self.breaker.state,
+            consecutive_failures=self.breaker.consecutive_failures,
+            times_opened=self.breaker.times_opened,
+            p95_ms=round(p95 * 1000) if p95 is not None else None,
+            hedge_rate=stats["hedged"] / stats["calls"] if stats["calls"] else 0.0,
+        )
+        return stats
@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+CACHE_DIR = os.getenv("VERONICA_CACHE_DIR", ".cache")
+
+_MISSING = object()
+
+
+class _LeaderGone(Exception):
+    """Handed to single-flight followers when the leading fetch was cancelled or interrupted."""
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Stable sha256 key for any JSON-serialisable parts."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed key/value cache with per-namespace TTLs and LRU eviction.
+
+    Values are JSON, zlib-compressed. The database is bounded by `max_bytes`
+    of compressed payload; the least recently read entries are dropped first.
+    `get_or_fetch` / `aget_or_fetch` collapse concurrent misses on the same key
+    (from any thread or event loop in this process) into a single fetch.
+    Expired entries are kept for `stale_grace` seconds so `get_stale` can
+    serve them while the upstream is down.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 256 * 1024 * 1024,
+        default_ttl: float = 24 * 3600,
+        ttls: Optional[Dict[str, float]] = None,
+        stale_grace: float = 0.0,
+    ):
+        self.path = path
+        self.stale_grace = stale_grace
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+
+        self._lock = threading.RLock()
+        self._inflight: Dict[str, Future] = {}
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "writes": 0, "evictions": 0, "expired": 0}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_access)")
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    # --- basic operations ---
+
+    def ttl_for(self, namespace: str) -> float:
+        return self.ttls.get(namespace, self.default_ttl)
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._counters["misses"] += 1
+                return default
+            if row[1] < now:
+                if row[1] + self.stale_grace < now:
+                    self._delete(key)
+                self._counters["expired"] += 1
+                self._counters["misses"] += 1
+                return default
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            self._counters["hits"] += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        blob = zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        now = time.time()
+        expires_at = now + (self.ttl_for(namespace) if ttl is None else ttl)
+        with self._lock:
+            self._delete(key)
+            self._conn.execute(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, namespace, blob, len(blob), now, expires_at, now),
+            )
+            self._bytes += len(blob)
+            self._counters["writes"] += 1
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def get_stale(self, key: str, default: Any = None) -> Any:
+        """The entry for `key` even if expired (within `stale_grace`); no hit/miss accounting."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] + self.stale_grace < time.time():
+            return default
+        return json.loads(zlib.decompress(row[0]))
+
+    def _delete(self, key: str):
+        row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._bytes -= row[0]
+
+    def _evict(self):
+        # Expired entries go first, then least recently used ones down to 90% of the bound
+        self._conn.execute("DELETE FROM entries WHERE expires_at < ?", (time.time() - self.stale_grace,))
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY last_access ASC").fetchall()
+        self._bytes = sum(size for _, size in rows)
+        target = self.max_bytes * 0.9
+        victims = []
+        for key, size in rows:
+            if self._bytes <= target:
+                break
+            victims.append((key,))
+            self._bytes -= size
+        if victims:
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+            self._counters["evictions"] += len(victims)
+
+    def clear(self, namespace: Optional[str] = None):
+        with self._lock:
+            if namespace is None:
+                self._conn.execute("DELETE FROM entries")
+            else:
+                self._conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+            self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    # --- single-flight ---
+
+    def _claim(self, key: str):
+        """Return (future, is_leader) for an in-flight fetch of `key`."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+
+    def _release(self, key: str):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def get_or_fetch(
+        self,
+        namespace: str,
+        key: str,
+        fetch: Callable[[], Any],
+        cacheable: Callable[[Any], bool] = lambda value: True,
+    ) -> Any:
+        while True:
+            value = self.get(namespace, key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+            future, is_leader = self._claim(key)
+            if not is_leader:
+                try:
+                    return future.result()
+                except _LeaderGone:
+                    continue  # the leader was interrupted; look again or take over
+            break
+
+        try:
+            value = fetch()
+            if cacheable(value):
+                self.set(namespace, key, value)
+        except Exception as e:
+            self._release(key)
+            future.set_exception(e)
+            raise
+        except BaseException:
+            self._release(key)  # before waking followers, so one of them can claim the key
+            future.set_exception(_LeaderGone())
+            raise
+        self._release(key)
+        future.set_result(value)
+        return value
+
+    async def aget_or_fetch(
+        self,
+        namespace: str,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda value: True,
+    ) -> Any:
+        # SQLite reads/writes and the zlib/json work are blocking, so they run off the event loop
+        while True:
+            value = await asyncio.to_thread(self.get, namespace, key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+            future, is_leader = self._claim(key)
+            if not is_leader:
+                try:
+                    # Shielded: a cancelled follower must not cancel the shared future
+                    return await asyncio.shield(asyncio.wrap_future(future))
+                except _LeaderGone:
+                    continue  # the leader was cancelled (e.g. a hedge loser); look again or take over
+            break
+
+        try:
+            value = await fetch()
+            if cacheable(value):
+                await asyncio.to_thread(self.set, namespace, key, value)
+        except Exception as e:
+            self._release(key)
+            future.set_exception(e)
+            raise
+        except BaseException:
+            # Cancellation belongs to the leader only, not to the callers sharing its fetch
+            self._release(key)  # before waking followers, so one of them can claim the key
+            future.set_exception(_LeaderGone())
+            raise
+        self._release(key)
+        future.set_result(value)
+        return value
+
+    # --- metrics ---
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            size = self._bytes
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+        counters.update({
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+        })
+        return counters
@@ -0,0 +1,260 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Any, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from utils.rate_limiter import get_limiter
+from utils.resilience import CircuitBreaker, HedgeSkipped, LatencyTracker, ResilientEndpoint
+from utils.response_cache import CACHE_DIR, ResponseCache, make_cache_key
+
+load_dotenv()
+SERPER_API_KEY = os.getenv("SERPER_API_KEY")
+SERPER_BASE_URL = os.getenv("SERPER_BASE_URL", "https://google.serper.dev")
+SERPER_TIMEOUT = float(os.getenv("SERPER_TIMEOUT", "30"))
+SERPER_MAX_CONNECTIONS = int(os.getenv("SERPER_MAX_CONNECTIONS", "64"))
+SERPER_HTTP2 = os.getenv("SERPER_HTTP2", "1").lower() in ("1", "true", "yes")
+
+# Response cache: prices move, so shopping results expire sooner than web lookups
+SERPER_CACHE_ENABLED = os.getenv("SERPER_CACHE", "1").lower() in ("1", "true", "yes")
+SERPER_CACHE_PATH = os.getenv("SERPER_CACHE_PATH", os.path.join(CACHE_DIR, "serper_cache.sqlite"))
+SERPER_CACHE_MAX_MB = float(os.getenv("SERPER_CACHE_MAX_MB", "256"))
+SERPER_CACHE_TTLS = {
+    "shopping": float(os.getenv("SERPER_CACHE_TTL_SHOPPING", str(6 * 3600))),
+    "search": float(os.getenv("SERPER_CACHE_TTL_SEARCH", str(7 * 24 * 3600))),
+}
+# Expired entries may still be served for this long when Serper is failing
+SERPER_STALE_GRACE = float(os.getenv("SERPER_STALE_GRACE", str(7 * 24 * 3600)))
+
+# Resilience: hedge a call slower than the endpoint's p95; fail fast after repeated failures
+SERPER_HEDGE = os.getenv("SERPER_HEDGE", "1").lower() in ("1", "true", "yes")
+SERPER_HEDGE_MAX_RATE = float(os.getenv("SERPER_HEDGE_MAX_RATE", "0.1"))
+SERPER_BREAKER_FAILURES = int(os.getenv("SERPER_BREAKER_FAILURES", "5"))
+SERPER_BREAKER_RESET = float(os.getenv("SERPER_BREAKER_RESET", "30"))
+
+
+def _http2_available() -> bool:
+    # httpx only speaks HTTP/2 when the optional `h2` package is installed
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class SerperClient:
+    """
+    Process-wide Serper client with pooled keep-alive connections.
+
+    One `httpx.Client` is shared by all threads. Async clients are bound to the
+    event loop they were created on, so one `httpx.AsyncClient` is kept per loop.
+    """
+
+    def __init__(
+        self,
+        api_key: str = SERPER_API_KEY,
+        base_url: str = SERPER_BASE_URL,
+        timeout: float = SERPER_TIMEOUT,
+        max_connections: int = SERPER_MAX_CONNECTIONS,
+        http2: bool = SERPER_HTTP2,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=60,
+        )
+        self.http2 = http2 and _http2_available()
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _client_kwargs(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "headers": {"X-API-KEY": self.api_key or "", "Content-Type": "application/json"},
+            "timeout": self.timeout,
+            "limits": self.limits,
+            "http2": self.http2,
+        }
+
+    def _get_client(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(**self._client_kwargs())
+        return self._client
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(**self._client_kwargs())
+                self._async_clients[loop] = client
+        return client
+
+    def post(self, endpoint: str, payload: Dict[str, Any]) -> httpx.Response:
+        """POST `payload` to `/<endpoint>` (e.g. "shopping", "search")."""
+        return self._get_client().post(f"/{endpoint}", json=payload)
+
+    async def apost(self, endpoint: str, payload: Dict[str, Any]) -> httpx.Response:
+        """Async version of `post`."""
+        return await self._get_async_client().post(f"/{endpoint}", json=payload)
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+_serper_client = None
+_serper_client_lock = threading.Lock()
+
+
+def get_serper_client() -> SerperClient:
+    global _serper_client
+    if _serper_client is None:
+        with _serper_client_lock:
+            if _serper_client is None:
+                _serper_client = SerperClient()
+    return _serper_client
+
+
+_endpoints: Dict[str, ResilientEndpoint] = {}
+
+
+def get_serper_endpoint(endpoint: str) -> ResilientEndpoint:
+    """Breaker and latency tracker for one Serper endpoint ("shopping", "search", ...)."""
+    resilient = _endpoints.get(endpoint)
+    if resilient is None:
+        with _serper_client_lock:
+            resilient = _endpoints.get(endpoint)
+            if resilient is None:
+                resilient = ResilientEndpoint(
+                    f"serper/{endpoint}",
+                    CircuitBreaker(SERPER_BREAKER_FAILURES, SERPER_BREAKER_RESET),
+                    LatencyTracker(),
+                    hedge=SERPER_HEDGE,
+                    hedge_max_rate=SERPER_HEDGE_MAX_RATE,
+                )
+                _endpoints[endpoint] = resilient
+    return resilient
+
+
+def serper_post(endpoint: str, payload: Dict[str, Any]) -> httpx.Response:
+    return get_serper_client().post(endpoint, payload)
+
+
+async def aserper_post(endpoint: str, payload: Dict[str, Any]) -> httpx.Response:
+    return await get_serper_client().apost(endpoint, payload)
+
+
+# --- Cached JSON entry points ---
+
+_serper_cache = None
+
+
+def get_serper_cache() -> ResponseCache:
+    global _serper_cache
+    if _serper_cache is None:
+        with _serper_client_lock:
+            if _serper_cache is None:
+                _serper_cache = ResponseCache(
+                    SERPER_CACHE_PATH,
+                    max_bytes=int(SERPER_CACHE_MAX_MB * 1024 * 1024),
+                    ttls=SERPER_CACHE_TTLS,
+                    stale_grace=SERPER_STALE_GRACE,
+                )
+    return _serper_cache
+
+
+def serper_cache_key(endpoint: str, payload: Dict[str, Any]) -> str:
+    query = " ".join(str(payload.get("q", "")).split()).lower()
+    return make_cache_key(
+        endpoint,
+        query,
+        str(payload.get("gl", "")).lower(),
+        str(payload.get("hl", "")).lower(),
+        payload.get("num"),
+    )
+
+
+def serper_search(endpoint: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    POST to Serper and return the decoded JSON body, served from the response
+    cache when possible. Raises `httpx.HTTPStatusError` on non-2xx responses,
+    which are never cached; 429s are retried within the shared rate limits.
+    While Serper is failing (or its breaker is open) a stale cached answer
+    is returned when there is one.
+    """
+    resilient = get_serper_endpoint(endpoint)
+
+    def post(settled: Optional[threading.Event] = None):
+        if settled is not None and settled.is_set():
+            raise HedgeSkipped("first request already answered")
+        response = serper_post(endpoint, payload)
+        response.raise_for_status()
+        return response
+
+    def fetch():
+        limiter = get_limiter("serper")
+        # A hedge is a second request, so it takes its own slot in the rate limits; if the
+        # first request answers while the hedge waits for that slot, the hedge is never sent
+        return limiter.call(resilient.call, post, lambda settled: limiter.call(post, settled)).json()
+
+    if not SERPER_CACHE_ENABLED:
+        return fetch()
+    key = serper_cache_key(endpoint, payload)
+    try:
+        return get_serper_cache().get_or_fetch(endpoint, key, fetch)
+    except httpx.HTTPError:
+        stale = get_serper_cache().get_stale(key)
+        if stale is None:
+            raise
+        resilient.record_stale_served()
+        return stale
+
+
+async def aserper_search(endpoint: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Async version of `serper_search`."""
+    resilient = get_serper_endpoint(endpoint)
+
+    async def post(settled: Optional[threading.Event] = None):
+        if settled is not None and settled.is_set():
+            raise HedgeSkipped("first request already answered")
+        response = await aserper_post(endpoint, payload)
+        response.raise_for_status()
+        return response
+
+    async def fetch():
+        limiter = get_limiter("serper")
+        # A hedge is a second request, so it takes its own slot in the rate limits
+        return (await limiter.acall(resilient.acall, post, lambda settled: limiter.acall(post, settled))).json()
+
+    if not SERPER_CACHE_ENABLED:
+        return await fetch()
+    key = serper_cache_key(endpoint, payload)
+    try:
+        return await get_serper_cache().aget_or_fetch(endpoint, key, fetch)
+    except httpx.HTTPError:
+        stale = await asyncio.to_thread(get_serper_cache().get_stale, key)
+        if stale is None:
+            raise
+        resilient.record_stale_served()
+        return stale
+
+
+def serper_cache_stats() -> Dict[str, Any]:
+    return get_serper_cache().stats()
+
+
+def serper_resilience_stats() -> Dict[str, Dict[str, Any]]:
+    """Breaker state, p95 latency and hedge/short-circuit/stale counters per endpoint."""
+    return {endpoint: resilient.stats() for endpoint, resilient in list(_endpoints.items())}
@@ -1,27 +1,146 @@
 import streamlit as st
-from typing import Dict
+from collections.abc import Mapping
+from typing import Any, BinaryIO, Callable, Dict, List
+
+# Generated export files kept across reruns, per session (newest last)
+EXPORT_CACHE_ENTRIES = 4
+
+
+def _export_cache() -> Dict[str, Dict[str, BinaryIO]]:
+    if "export_cache" not in st.session_state:
+        st.session_state.export_cache = {}
+    return st.session_state.export_cache
+
+
+def show_download_buttons(files: Mapping, file_name: str = "products", key: str = "products"):
+    """
+    One button per export format. Lazy exports (`ProductExport`) are only
+    written when their "Prepare" button is clicked, which reruns just these
+    buttons; the result is kept for the session.
+    """
+    from utils.product_utils import EXPORT_FORMATS
+
+    cache_key = f"{key}:{getattr(files, 'fingerprint', '')}"
+
+    @st.fragment
+    def buttons():
+        cache = _export_cache()
+        prepared = cache.pop(cache_key, {})
+        cache[cache_key] = prepared  # most recently shown last
+        # Drop the oldest exports so a long session does not pile up files
+        while len(cache) > EXPORT_CACHE_ENTRIES:
+            cache.pop(next(iter(cache)))
+
+        formats = list(files)
+        for column, fmt in zip(st.columns(len(formats)), formats):
+            label, mime = EXPORT_FORMATS[fmt]
+            with column:
+                if fmt not in prepared and not getattr(files, "is_lazy", False):
+                    prepared[fmt] = files[fmt]
+                if fmt not in prepared and st.button(f"Prepare {label}", key=f"prepare_{cache_key}_{fmt}"):
+                    with st.spinner(f"Writing {label}..."):
+                        prepared[fmt] = files[fmt]
+                if fmt in prepared:
+                    st.download_button(
+                        label=f"Download {label}",
+                        data=prepared[fmt],
+                        file_name=f"{file_name}.{fmt}",
+                        mime=mime,
+                        key=f"download_{cache_key}_{fmt}",
+                    )
 
-def show_download_buttons(files: Dict[str, bytes]):
     with st.container():
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.download_button(
-                label="Download CSV",
-                data=files["csv"],
-                file_name="products.csv",
-                mime="text/csv"
-            )
-        with col2:
-            st.download_button(
-                label="Download XLSX",
-                data=files["xlsx"],
-                file_name="products.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-        with col3:
-            st.download_button(
-                label="Download JSON",
-                data=files["json"],
-                file_name="products.json",
-                mime="application/json"
-            )
+        buttons()
+
+
+JOBS_REFRESH_SECONDS = 1.0
+
+
+def _job_caption(entry: Dict[str, Any]) -> str:
+    parts = [f"{entry['done']}/{entry['total']} rows"]
+    if entry["rows_per_s"]:
+        parts.append(f"{entry['rows_per_s']:.1f} rows/s")
+    if entry["eta_s"] is not None:
+        parts.append(f"ETA {int(entry['eta_s'] // 60)}m {int(entry['eta_s'] % 60)}s")
+    if entry["errors"]:
+        parts.append(f"{entry['errors']} errors")
+    return " · ".join(parts)
+
+
+def _job_stats_captions(entry: Dict[str, Any]) -> List[str]:
+    """The per-run counters a worker reported for this job (see utils/job_runner.py)."""
+    stats = entry["stats"]
+    captions = []
+    if entry["resumed"]:
+        captions.append(f"♻️ Resumed: {entry['resumed']}/{entry['total']} rows restored from the last run")
+    if "rows_sent_to_llm" in stats:
+        captions.append(
+            f"🧮 Rows decided locally: {stats['rows_accepted_locally']} accepted, "
+            f"{stats['rows_rejected_locally']} rejected; {stats['rows_sent_to_llm']} sent to LLM"
+        )
+        captions.append(
+            f"🧠 LLM filter: {stats['llm_calls']} calls ({stats['batched_calls']} batched), "
+            f"{stats['cache_hits']} cache hits "
+            f"(~{stats['prompt_tokens_saved'] + stats['completion_tokens_saved']} tokens saved)"
+        )
+    if "unique_total" in stats:
+        captions.append(
+            f"🔄 {stats['unique_done']}/{stats['unique_total']} unique queries · "
+            f"{stats['duplicates_saved']} duplicate rows reused"
+        )
+    return captions
+
+
+ACTIVE_JOB_STATUSES = ("queued", "running")
+
+
+def _job_header(entry: Dict[str, Any]):
+    st.markdown(f"**{entry['kind']} · {entry['job_id'][:8]} · {entry['status']}**")
+    if entry["status"] in ACTIVE_JOB_STATUSES:
+        st.progress(entry["done"] / entry["total"] if entry["total"] else 0.0)
+    st.caption(_job_caption(entry))
+    for caption in _job_stats_captions(entry):
+        st.caption(caption)
+    if entry["last_error"]:
+        st.caption(f"⚠️ Last error: {entry['last_error']}")
+
+
+def show_jobs_panel(job_ids: List[str], render_result: Callable[[Dict[str, Any]], None]):
+    """
+    Progress of background jobs (utils/job_runner.py). Queued and running
+    jobs poll in a fragment that reruns only itself; once one of them
+    finishes the app reruns, and finished jobs are handed to
+    `render_result(entry)` once per run, outside the polling.
+    """
+    from utils.job_runner import ensure_workers, job_panel_rows
+
+    if not job_ids:
+        return
+    entries = job_panel_rows(job_ids)
+    active_ids = [entry["job_id"] for entry in entries if entry["status"] in ACTIVE_JOB_STATUSES]
+
+    if active_ids:
+        @st.fragment(run_every=JOBS_REFRESH_SECONDS)
+        def progress():
+            current = job_panel_rows(active_ids)
+            if any(entry["status"] not in ACTIVE_JOB_STATUSES for entry in current):
+                st.rerun()  # show the finished job's results
+            if any(entry["status"] == "queued" for entry in current):
+                ensure_workers()  # e.g. requeued after every worker went away
+            for entry in current:
+                with st.container(border=True):
+                    _job_header(entry)
+
+        progress()
+
+    for entry in entries:
+        if entry["status"] in ACTIVE_JOB_STATUSES:
+            continue
+        with st.container(border=True):
+            _job_header(entry)
+            if entry["status"] == "done":
+                if entry["errors"]:
+                    st.warning(f"{entry['errors']} rows failed and are shown as errors; submit the same input again to retry them.")
+                render_result(entry)
+            elif entry["status"] == "failed":
+                st.error("Job failed; submit the same input again to resume. Finished rows are kept.")
@@ -0,0 +1,83 @@
+import os
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, List, Sequence
+
+from utils.lazy_loader import lazy_import
+from utils.llm_batching import pack_batches
+
+
+@dataclass(frozen=True)
+class ModelLimits:
+    context: int
+    max_output: int
+
+    @property
+    def prompt_budget(self) -> int:
+        return self.context - self.max_output
+
+
+# Context window and the output we reserve per request
+MODEL_LIMITS: Dict[str, ModelLimits] = {
+    "llama3-70b-8192": ModelLimits(context=8192, max_output=2048),
+    "llama3-8b-8192": ModelLimits(context=8192, max_output=2048),
+    "gpt-4o-mini": ModelLimits(context=128000, max_output=16384),
+    "gpt-4o": ModelLimits(context=128000, max_output=16384),
+    "gpt-3.5-turbo": ModelLimits(context=16385, max_output=4096),
+}
+DEFAULT_LIMITS = ModelLimits(context=8192, max_output=2048)
+
+# Encodings for models tiktoken does not know (e.g. Groq-hosted llama3)
+FALLBACK_ENCODING = os.getenv("TOKEN_FALLBACK_ENCODING", "cl100k_base")
+
+_lock = threading.Lock()
+_usage: Dict[str, Dict[str, int]] = {}
+
+
+def get_model_limits(model: str) -> ModelLimits:
+    return MODEL_LIMITS.get(model, DEFAULT_LIMITS)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model_name: str):
+    """tiktoken encoder for `model_name`, resolved once per process (tiktoken itself loads on first use)."""
+    tiktoken = lazy_import("tiktoken")
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding(FALLBACK_ENCODING)
+
+
+def count_tokens(text: str, model_name: str = "gpt-3.5-turbo") -> int:
+    return len(get_encoding(model_name).encode(text))
+
+
+def split_to_budget(items: Sequence, cost: Callable[[object], int], budget: int, max_items: int = 10**9) -> List[List]:
+    """
+    Split `items` into consecutive chunks whose summed cost fits `budget`,
+    so nothing is dropped. An item that alone exceeds the budget is kept in a
+    chunk of its own.
+    """
+    return [[items[i] for i in chunk] for chunk in pack_batches([cost(item) for item in items], budget, max_items)]
+
+
+def record_usage(model: str, estimated_prompt: int, actual_prompt: int, completion: int):
+    """Record estimated vs. provider-reported tokens for one call."""
+    with _lock:
+        entry = _usage.setdefault(model, {"calls": 0, "estimated_prompt": 0, "actual_prompt": 0, "completion": 0})
+        entry["calls"] += 1
+        entry["estimated_prompt"] += estimated_prompt
+        entry["actual_prompt"] += actual_prompt or estimated_prompt
+        entry["completion"] += completion
+
+
+def token_usage_report() -> Dict[str, Dict[str, float]]:
+    """Per-model totals plus the actual/estimated prompt ratio for tuning budgets."""
+    with _lock:
+        report = {model: dict(entry) for model, entry in _usage.items()}
+    for entry in report.values():
+        entry["actual_to_estimated"] = (
+            entry["actual_prompt"] / entry["estimated_prompt"] if entry["estimated_prompt"] else 0.0
+        )
+    return report